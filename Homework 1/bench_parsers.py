@@ -0,0 +1,81 @@
+"""Compare the HTML parser backends on saved MSE symbol history pages.
+
+Save a few pages first, e.g.
+
+    curl -o samples/alk.html "https://www.mse.mk/en/stats/symbolhistory/ALK?FromDate=01/01/2024&ToDate=12/31/2024&Code=ALK"
+
+and run `python bench_parsers.py samples/*.html`. Without arguments a
+synthetic page with a year of rows in the same markup is used instead.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from mse_parsers import NUMERIC_COLUMNS, PARSERS, lxml
+
+
+def synthetic_page(rows=250):
+    day = datetime(2024, 1, 2)
+    price = 1000.0
+    body = []
+    for _ in range(rows):
+        price *= 1 + random.uniform(-0.02, 0.02)
+        volume = random.randint(0, 5000)
+        cells = [day.strftime("%m/%d/%Y")] + [f"{price:,.2f}"] * 4 + \
+                [f"{random.uniform(-2, 2):.2f}", f"{volume:,}", f"{volume * price:,.0f}", f"{volume * price:,.0f}"]
+        body.append("<tr>" + "".join(f'<td class="text-right">{c}</td>' for c in cells) + "</tr>")
+        day += timedelta(days=1)
+    return (
+        "<html><head><title>Symbol history</title></head><body>"
+        '<select id="Code"><option>ALK</option></select>'
+        '<table id="resultsTable" class="table table-bordered">'
+        "<thead><tr>" + "<th>Col</th>" * 9 + "</tr></thead>"
+        "<tbody>" + "".join(body) + "</tbody></table></body></html>"
+    )
+
+
+def load_pages(paths):
+    pages = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def same_result(left, right):
+    if left['Date'] != right['Date']:
+        return False
+    return all(np.array_equal(left[c], right[c]) for c in NUMERIC_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pages', nargs='*', help="saved symbol history pages")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages) if args.pages else [('synthetic', synthetic_page())]
+    backends = [name for name in PARSERS if name != 'lxml' or lxml is not None]
+
+    for name, html in pages:
+        reference = PARSERS['bs4'](html, 'ALK')
+        print(f"{name}: {len(html) / 1024:.0f} KB, {len(reference['Date'])} rows")
+        baseline = None
+        for backend in backends:
+            parse = PARSERS[backend]
+            result = parse(html, 'ALK')
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                parse(html, 'ALK')
+            elapsed = (time.perf_counter() - start) / args.repeat * 1000
+            baseline = baseline or elapsed
+            status = "ok" if same_result(reference, result) else "MISMATCH"
+            print(f"  {backend:<6} {elapsed:8.2f} ms/page  {baseline / elapsed:6.1f}x  {status}")
+
+
+if __name__ == '__main__':
+    main()
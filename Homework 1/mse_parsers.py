@@ -0,0 +1,112 @@
+"""Parsers for the MSE symbol history page.
+
+Every backend turns one page into the same columnar result: a dict mapping
+each CSV column to a list/array with one entry per trading day. The
+functions are module level so they can be shipped to a ProcessPoolExecutor.
+"""
+import html as html_lib
+import re
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+NUMERIC_COLUMNS = ['Last_Price', 'High', 'Low', 'Average', 'Change_Pct',
+                   'Volume', 'Turnover', 'Total_Turnover']
+COLUMNS = ['Date', 'Company'] + NUMERIC_COLUMNS
+
+_TABLE_RE = re.compile(r'<table[^>]*\bid=["\']resultsTable["\'][^>]*>.*?<tbody[^>]*>(.*?)</tbody>',
+                       re.S | re.I)
+_ROW_RE = re.compile(r'<tr[^>]*>(.*?)</tr>', re.S | re.I)
+_CELL_RE = re.compile(r'<td[^>]*>(.*?)</td>', re.S | re.I)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _to_columns(rows, company):
+    """Build the columnar result from rows of cell texts (at least 9 cells each)."""
+    if not rows:
+        return empty_columns()
+
+    cells = np.array([row[:9] for row in rows], dtype=object)
+    dates = pd.to_datetime(pd.Series(cells[:, 0]).str.strip(), format="%m/%d/%Y", errors='coerce')
+    valid = dates.notna().to_numpy()
+
+    # Convert all numeric cells in one pass instead of column by column
+    text = pd.Series(cells[valid, 1:].ravel()).str.replace(',', '', regex=False)
+    # Unparseable or empty cells stay NaN; storage keeps them as missing, not as 0
+    numbers = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64)
+    numbers = numbers.reshape(-1, len(NUMERIC_COLUMNS))
+
+    columns = {
+        'Date': dates[valid].dt.strftime("%Y-%m-%d").tolist(),
+        'Company': [company] * len(numbers),
+    }
+    for i, name in enumerate(NUMERIC_COLUMNS):
+        columns[name] = np.ascontiguousarray(numbers[:, i])
+    return columns
+
+
+def empty_columns():
+    columns = {'Date': [], 'Company': []}
+    for name in NUMERIC_COLUMNS:
+        columns[name] = np.empty(0, dtype=np.float64)
+    return columns
+
+
+def parse_bs4(html, company):
+    soup = BeautifulSoup(html, 'html.parser')
+    rows = []
+    for row in soup.select("#resultsTable tbody tr"):
+        cols = row.select("td")
+        if len(cols) >= 9:
+            rows.append([col.text for col in cols])
+    return _to_columns(rows, company)
+
+
+def parse_lxml(html, company):
+    if lxml is None:
+        raise RuntimeError("lxml is not installed")
+    if not html.strip():
+        return empty_columns()
+    tree = lxml.html.fromstring(html)
+    rows = []
+    for row in tree.xpath('//table[@id="resultsTable"]/tbody/tr'):
+        cols = row.xpath('./td')
+        if len(cols) >= 9:
+            rows.append([col.text_content() for col in cols])
+    return _to_columns(rows, company)
+
+
+def parse_regex(html, company):
+    """Targeted extractor that only scans the body of #resultsTable."""
+    match = _TABLE_RE.search(html)
+    if not match:
+        return empty_columns()
+    rows = []
+    for row_html in _ROW_RE.findall(match.group(1)):
+        cols = _CELL_RE.findall(row_html)
+        if len(cols) >= 9:
+            rows.append([html_lib.unescape(_TAG_RE.sub('', col)) for col in cols])
+    return _to_columns(rows, company)
+
+
+PARSERS = {
+    'bs4': parse_bs4,
+    'lxml': parse_lxml,
+    'regex': parse_regex,
+}
+
+DEFAULT_PARSER = 'regex'
+
+
+def parse_page(html, company, backend=DEFAULT_PARSER):
+    try:
+        parser = PARSERS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown parser backend: {backend}")
+    return parser(html, company)
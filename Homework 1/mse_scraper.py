@@ -2,10 +2,16 @@ import aiohttp
 import asyncio
 import pandas as pd
 from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import logging
+import argparse
+import random
 import time
 
+from mse_parsers import COLUMNS, DEFAULT_PARSER, PARSERS, parse_page
+from mse_storage import MSEStore
+
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,16 +19,51 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Spaces request starts so that at most `rate` begin per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
 class MSEScraper:
-    def __init__(self):
+    def __init__(self, max_concurrency=8, requests_per_second=5.0, max_retries=4,
+                 backoff_base=1.0, backoff_max=30.0, timeout=60,
+                 parser=DEFAULT_PARSER, parse_workers=None):
         self.base_url = "https://www.mse.mk/en/stats/symbolhistory"
         self.companies_url = "https://www.mse.mk/en/stats/symbolhistory/alk"
-        self.output_file = "mse_data.csv"  
+        self.store = MSEStore("mse_store")
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.parser = parser
+        self.parse_workers = parse_workers
+        self.failed_windows = []
 
     async def create_session(self):
-        return aiohttp.ClientSession(headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        return aiohttp.ClientSession(
+            headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            },
+            connector=aiohttp.TCPConnector(limit_per_host=self.max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
 
     async def fetch_companies(self, session):
         try:
@@ -42,9 +83,10 @@ class MSEScraper:
             logger.error(f"Error fetching companies: {e}")
             return []
 
-    def get_date_ranges(self, years=10):
+    def get_date_ranges(self, years=10, start_date=None):
         end_date = datetime.now()
-        start_date = end_date - timedelta(days=365 * years)
+        if start_date is None:
+            start_date = end_date - timedelta(days=365 * years)
         
         ranges = []
         current_date = start_date
@@ -60,63 +102,110 @@ class MSEScraper:
         return ranges
 
     async def fetch_company_data(self, session, company, date_range):
+        params = {
+            'FromDate': date_range[0],
+            'ToDate': date_range[1],
+            'Code': company,
+        }
+
+        async with session.get(f"{self.base_url}/{company}", params=params) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    async def parse_company_data(self, executor, html, company):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, parse_page, html, company, self.parser)
+
+    def backoff_delay(self, attempt):
+        # Full jitter keeps retries from many windows from arriving in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def fetch_window(self, session, executor, semaphore, limiter, company, date_range):
+        html = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    await limiter.acquire()
+                    html = await self.fetch_company_data(session, company, date_range)
+                break
+            except aiohttp.ClientResponseError as e:
+                error = e
+                if e.status not in RETRYABLE_STATUSES:
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt < self.max_retries:
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Retrying {company} {date_range[0]}-{date_range[1]} in {delay:.1f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries}): {error}")
+                await asyncio.sleep(delay)
+
+        if html is None:
+            reason = f"HTTP {error.status}" if isinstance(error, aiohttp.ClientResponseError) else repr(error)
+            return self.give_up(company, date_range, reason)
+
+        # Parsing happens outside the semaphore so it never holds a connection slot. A page that
+        # fails to parse (or a broken parse pool) would fail the same way again, so it is not retried
         try:
-            params = {
-                'FromDate': date_range[0],
-                'ToDate': date_range[1],
-                'Code': company,
-            }
-            
-            async with session.get(f"{self.base_url}/{company}", params=params) as response:
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                rows = []
-                
-                for row in soup.select("#resultsTable tbody tr"):
-                    cols = row.select("td")
-                    if len(cols) >= 9:
-                        try:
-                            row_data = {
-                                "Date": datetime.strptime(cols[0].text.strip(), "%m/%d/%Y").strftime("%Y-%m-%d"),
-                                "Company": company,
-                                "Last_Price": self._clean_number(cols[1].text),
-                                "High": self._clean_number(cols[2].text),
-                                "Low": self._clean_number(cols[3].text),
-                                "Average": self._clean_number(cols[4].text),
-                                "Change_Pct": self._clean_number(cols[5].text),
-                                "Volume": self._clean_number(cols[6].text),
-                                "Turnover": self._clean_number(cols[7].text),
-                                "Total_Turnover": self._clean_number(cols[8].text)
-                            }
-                            rows.append(row_data)
-                        except Exception as e:
-                            continue
-                
-                return rows
+            return await self.parse_company_data(executor, html, company)
         except Exception as e:
-            logger.error(f"Error fetching data for {company}: {e}")
+            return self.give_up(company, date_range, f"parse error: {e!r}")
+
+    def give_up(self, company, date_range, reason):
+        logger.error(f"Giving up on {company} {date_range[0]}-{date_range[1]}: {reason}")
+        self.failed_windows.append((company, date_range[0], date_range[1], reason))
+        return None
+
+    async def fetch_all(self, session, jobs):
+        """Fetch every (company, date_range) job concurrently within the configured limits.
+
+        Pages are parsed in a process pool; each successful job yields a DataFrame.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.requests_per_second)
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+            tasks = [
+                asyncio.create_task(self.fetch_window(session, executor, semaphore, limiter, company, date_range))
+                for company, date_range in jobs
+            ]
+            results = await asyncio.gather(*tasks)
+        return [pd.DataFrame(columns, columns=COLUMNS) for columns in results if columns is not None]
+
+    def save(self, data):
+        df = pd.DataFrame(data, columns=COLUMNS)
+        self.store.write(df)
+        logger.info(f"Saved {len(df)} records to {self.store.root}")
+
+    def load_last_dates(self):
+        """Return the latest stored Date (YYYY-MM-DD) per Company."""
+        return self.store.last_dates()
+
+    def get_missing_ranges(self, company, last_dates):
+        last_date = last_dates.get(company)
+        if last_date is None:
+            return self.get_date_ranges()
+
+        start_date = datetime.strptime(last_date, "%Y-%m-%d") + timedelta(days=1)
+        if start_date.date() > datetime.now().date():
             return []
+        return self.get_date_ranges(start_date=start_date)
 
-    @staticmethod
-    def _clean_number(value):
-        try:
-            return float(value.strip().replace(',', ''))
-        except (ValueError, AttributeError):
-            return 0.0
-
-    async def process_company(self, session, company, date_ranges):
-        all_data = []
-        for date_range in date_ranges:
-            data = await self.fetch_company_data(session, company, date_range)
-            all_data.extend(data)
-        return all_data
-
-    def save_to_csv(self, data):
-        df = pd.DataFrame(data)
-        df.to_csv(self.output_file, index=False)
-        logger.info(f"Saved {len(df)} records to {self.output_file}")
-
-    async def run(self):
+    def append(self, data, last_dates):
+        df = pd.DataFrame(data, columns=COLUMNS)
+        if not df.empty:
+            # Drop anything the store already has so only partitions with new days are rewritten
+            stored = df['Company'].map(last_dates).fillna('')
+            df = df[df['Date'] > stored]
+
+        if df.empty:
+            logger.info("No new records to append")
+            return
+
+        self.store.append(df)
+        logger.info(f"Appended {len(df)} records for {df['Company'].nunique()} companies to {self.store.root}")
+
+    async def run(self, incremental=False):
         start_time = time.time()
         
         async with await self.create_session() as session:
@@ -125,26 +214,59 @@ class MSEScraper:
             if not companies:
                 return
             
-            date_ranges = self.get_date_ranges()
-            all_data = []
-            tasks = []
+            last_dates = self.load_last_dates() if incremental else {}
+            jobs = []
+            self.failed_windows = []
             
             for company in companies:
-                task = self.process_company(session, company, date_ranges)
-                tasks.append(task)
-            
-            results = await asyncio.gather(*tasks)
-            for company_data in results:
-                all_data.extend(company_data)
+                for date_range in self.get_missing_ranges(company, last_dates):
+                    jobs.append((company, date_range))
+
+            logger.info(f"Scheduling {len(jobs)} windows for {len(companies)} companies")
+            frames = await self.fetch_all(session, jobs)
+            all_data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+
+            if self.failed_windows:
+                failed_companies = {company for company, *_ in self.failed_windows}
+                logger.error(f"{len(self.failed_windows)} windows failed permanently:")
+                for company, from_date, to_date, error in self.failed_windows:
+                    logger.error(f"  {company} {from_date}-{to_date}: {error}")
+                if incremental:
+                    # Appending around a gap would move the company's last date past it
+                    # and the next incremental run would never refetch the missing window
+                    all_data = all_data[~all_data['Company'].isin(failed_companies)]
             
-            self.save_to_csv(all_data)
+            if incremental:
+                self.append(all_data, last_dates)
+            else:
+                self.save(all_data)
             
             elapsed_time = time.time() - start_time
             logger.info(f"Completed in {elapsed_time:.2f} seconds")
+            return self.failed_windows
 
 def main():
-    scraper = MSEScraper()
-    asyncio.run(scraper.run())
+    parser = argparse.ArgumentParser(description="Scrape historical data from the Macedonian Stock Exchange")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only fetch days after the last stored date per company and append them")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="maximum number of requests in flight")
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help="maximum number of requests started per second")
+    parser.add_argument('--retries', type=int, default=4,
+                        help="retries per window before it is reported as failed")
+    parser.add_argument('--parser', choices=sorted(PARSERS), default=DEFAULT_PARSER,
+                        help="HTML parser backend used for the history pages")
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help="number of parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    scraper = MSEScraper(max_concurrency=args.concurrency,
+                         requests_per_second=args.rate,
+                         max_retries=args.retries,
+                         parser=args.parser,
+                         parse_workers=args.parse_workers)
+    asyncio.run(scraper.run(incremental=args.incremental))
 
 if __name__ == "__main__":
     main()
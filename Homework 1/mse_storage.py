@@ -0,0 +1,220 @@
+"""Columnar storage for the scraped MSE data.
+
+The dataset is kept as one Arrow IPC (Feather) file per company inside a
+store directory, plus a small JSON manifest with the row count and latest
+date of every partition:
+
+    mse_store/
+        _manifest.json
+        ALK.feather
+        KMB.feather
+        ...
+
+Columns are stored in a compact typed layout, so readers never parse
+anything and loading one issuer only touches that issuer's file:
+
+    Date                         date32 (int32 day number)
+    Company                      dictionary-encoded (pandas category)
+    Last_Price ... Change_Pct    float32
+    Volume, Turnover, ...        int64 with a validity mask (pandas Int64)
+
+Missing numbers stay missing (NaN / <NA>) instead of being stored as 0.
+Partitions are uncompressed, so they are read through a memory map, and
+they are written to a temporary file and renamed into place, so readers
+never see a half-written file. Partitions written by older versions
+(float64 everywhere) are converted to this layout when read.
+
+To convert an existing mse_data.csv:
+
+    python mse_storage.py mse_data.csv mse_store
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+MANIFEST = '_manifest.json'
+COLUMNS = ['Date', 'Company', 'Last_Price', 'High', 'Low', 'Average', 'Change_Pct',
+           'Volume', 'Turnover', 'Total_Turnover']
+PRICE_COLUMNS = COLUMNS[2:7]
+COUNT_COLUMNS = COLUMNS[7:]
+
+SCHEMA = pa.schema([('Date', pa.date32()), ('Company', pa.dictionary(pa.int32(), pa.string()))] +
+                   [(col, pa.float32()) for col in PRICE_COLUMNS] +
+                   [(col, pa.int64()) for col in COUNT_COLUMNS])
+
+
+class MSEStore:
+    def __init__(self, root):
+        self.root = root
+
+    def exists(self):
+        return os.path.exists(self.manifest_path())
+
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST)
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': 0, 'companies': {}}
+
+    def version(self):
+        return self.manifest()['version']
+
+    def companies(self):
+        return sorted(self.manifest()['companies'])
+
+    def last_dates(self):
+        """Return the latest stored Date (YYYY-MM-DD) per Company without reading any data."""
+        return {company: info['last_date'] for company, info in self.manifest()['companies'].items()}
+
+    def _path(self, company):
+        return os.path.join(self.root, f'{company}.feather')
+
+    def read_company(self, company, columns=None, companies=None):
+        """Load one issuer's history, sorted by Date descending.
+
+        `companies` sets the categories of the Company column (by default
+        just this company), which lets read_all() concatenate the partitions
+        without falling back to object strings.
+        """
+        path = self._path(company)
+        if not os.path.exists(path):
+            return _compact(pd.DataFrame(columns=columns or COLUMNS), companies or [company])
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        return _compact(_to_pandas(table), companies or [company])
+
+    def read_all(self, columns=None):
+        """Load every issuer's history, one newest-first block per company in name order.
+
+        The partitions are read without their Company column, concatenated
+        as Arrow tables and converted to pandas in one go; Company is then
+        rebuilt from the manifest as category codes repeated per partition.
+        """
+        columns = list(columns or COLUMNS)
+        data_columns = [col for col in columns if col != 'Company']
+        schema = pa.schema([SCHEMA.field(col) for col in data_columns])
+        partitions = self.manifest()['companies']
+        companies = sorted(partitions)
+
+        tables, lengths = [], []
+        for company in companies:
+            path = self._path(company)
+            if not os.path.exists(path):
+                lengths.append(0)
+                continue
+            table = feather.read_table(path, columns=data_columns, memory_map=True)
+            if not table.schema.equals(schema):
+                # Partitions written by older versions are converted one by one
+                df = _compact(_to_pandas(table), [company])
+                table = pa.Table.from_pandas(df[data_columns], schema=schema, preserve_index=False)
+            tables.append(table)
+            lengths.append(table.num_rows if data_columns else partitions[company]['rows'])
+
+        if not tables:
+            return _compact(pd.DataFrame(columns=columns), companies)
+        df = _compact(_to_pandas(pa.concat_tables(tables)), companies)
+        if 'Company' in columns:
+            codes = np.repeat(np.arange(len(companies), dtype=np.int32), lengths)
+            df.insert(columns.index('Company'), 'Company', pd.Categorical.from_codes(codes, companies))
+        return df
+
+    def write(self, df):
+        """Replace the partitions of every company present in df."""
+        self._write_partitions({company: group for company, group in df.groupby('Company', sort=False, observed=True)})
+
+    def append(self, df):
+        """Merge new rows into the affected partitions; existing rows for the same Date are replaced."""
+        partitions = {}
+        for company, group in df.groupby('Company', sort=False, observed=True):
+            existing = self.read_company(company)
+            if not existing.empty:
+                group = pd.concat([existing, _typed(group)], ignore_index=True)
+            partitions[company] = group.drop_duplicates('Date', keep='last')
+        self._write_partitions(partitions)
+
+    def _write_partitions(self, partitions):
+        if not partitions:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        manifest = self.manifest()
+
+        for company, group in partitions.items():
+            group = _typed(group).sort_values('Date', ascending=False).reset_index(drop=True)
+            path = self._path(company)
+            table = pa.Table.from_pandas(group, schema=SCHEMA, preserve_index=False)
+            feather.write_feather(table, path + '.tmp', compression='uncompressed')
+            os.replace(path + '.tmp', path)
+            manifest['companies'][company] = {
+                'rows': len(group),
+                'last_date': group['Date'].iloc[0].strftime('%Y-%m-%d') if len(group) else None,
+            }
+
+        manifest['version'] += 1
+        manifest['updated'] = datetime.now().isoformat(timespec='seconds')
+        tmp = os.path.join(self.root, MANIFEST + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path())
+
+
+def _to_pandas(table):
+    return table.to_pandas(date_as_object=False, types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def _typed(df):
+    df = df.reindex(columns=COLUMNS).copy()
+    df['Company'] = df['Company'].astype(str)
+    return _compact(df, sorted(df['Company'].unique()))
+
+
+def _compact(df, companies):
+    """Convert whichever columns are present to the compact in-memory layout."""
+    if 'Date' in df and df['Date'].dtype != 'datetime64[ns]':
+        df['Date'] = pd.to_datetime(df['Date'])
+    if 'Company' in df:
+        df['Company'] = df['Company'].astype(pd.CategoricalDtype(companies))
+    for col in PRICE_COLUMNS:
+        if col in df and df[col].dtype != 'float32':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    for col in COUNT_COLUMNS:
+        if col in df and df[col].dtype != 'Int64':
+            # Counts and denar amounts are whole numbers; older partitions stored them as floats
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+    return df
+
+
+def find_store(locations):
+    """Return the first existing store among the candidate directories, or None."""
+    for location in locations:
+        store = MSEStore(location)
+        if store.exists():
+            return store
+    return None
+
+
+def import_csv(csv_path, root):
+    df = pd.read_csv(csv_path)
+    MSEStore(root).write(df)
+    return len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert mse_data.csv into a partitioned columnar store")
+    parser.add_argument('csv', help="path to mse_data.csv")
+    parser.add_argument('store', help="store directory to create or update")
+    args = parser.parse_args()
+    rows = import_csv(args.csv, args.store)
+    print(f"Imported {rows} rows into {args.store}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Backtests of the technical signals for many companies and parameter sets at once.
+
+Prices are the bars x companies matrix of cross_section.price_matrix()
+(Homework 4/common), so every column's indicators are the ones
+TechnicalAnalysis computes for that company. A strategy turns the matrix
+and a list of parameter sets into a bars x companies x params tensor of
+signal codes (BUY/HOLD/SELL, as in TechnicalAnalysis.signal_codes());
+positions, returns, drawdowns and hit rates are then computed over the
+whole tensor with NumPy.
+
+A position is long after a buy signal, flat after a sell, and unchanged on
+hold. It is taken at the close of the signal's bar, so it earns the next
+bar's return. sweep() splits a grid of parameter sets into chunks and
+backtests them in a process pool.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.technical import BUY, HOLD, SELL
+
+METRICS = ['total_return', 'buy_and_hold', 'max_drawdown', 'hit_rate', 'trades', 'exposure']
+
+# The parameters TechnicalAnalysis.signal_codes() uses
+DEFAULT_PARAMS = {'sma': (20, 50), 'rsi': (14, 30, 70), 'macd': (12, 26, 9)}
+
+DEFAULT_GRID = {
+    'sma': [(fast, slow) for fast in (5, 10, 20, 30) for slow in (50, 100, 200)],
+    'rsi': [(period, lower, 100 - lower) for period in (7, 14, 21) for lower in (20, 30, 40)],
+    'macd': [(fast, slow, signal) for fast, slow in ((8, 17), (12, 26), (19, 39)) for signal in (5, 9)],
+}
+
+
+def _compare(above: np.ndarray, below: np.ndarray) -> np.ndarray:
+    # NaN comparisons are False, so bars before a window fills are 'sell'
+    return np.where(above > below, BUY, SELL).astype(np.int8)
+
+
+def sma_signals(prices: pd.DataFrame, params: Sequence[Tuple[int, int]]) -> np.ndarray:
+    """Buy while the (fast) SMA is above the (slow) one, for each (fast, slow) pair"""
+    windows = {window for pair in params for window in pair}
+    sma = {window: prices.rolling(window=window).mean().to_numpy() for window in windows}
+    return np.stack([_compare(sma[fast], sma[slow]) for fast, slow in params], axis=-1)
+
+
+def rsi_matrix(prices: pd.DataFrame, period: int) -> np.ndarray:
+    """RSI of every column, as TechnicalAnalysis.calculate_rsi() computes it"""
+    # A company's first bar counts as a zero gain and loss; the NaN padding
+    # above it must stay NaN
+    delta = prices.diff()
+    listed = prices.notna()
+    gains = delta.where(delta > 0, 0.0).where(listed)
+    losses = (-delta.where(delta < 0, 0.0)).where(listed)
+    rs = gains.rolling(window=period).mean() / losses.rolling(window=period).mean()
+    return (100 - (100 / (1 + rs))).fillna(50).to_numpy()
+
+
+def rsi_signals(prices: pd.DataFrame, params: Sequence[Tuple[int, float, float]]) -> np.ndarray:
+    """Buy below `lower`, sell above `upper`, hold in between, for each (period, lower, upper)"""
+    rsi = {period: rsi_matrix(prices, period) for period in {p[0] for p in params}}
+    return np.stack([np.select([rsi[period] < lower, rsi[period] > upper], [BUY, SELL], HOLD)
+                     .astype(np.int8) for period, lower, upper in params], axis=-1)
+
+
+def macd_signals(prices: pd.DataFrame, params: Sequence[Tuple[int, int, int]]) -> np.ndarray:
+    """Buy while MACD is above its signal line, for each (fast, slow, signal) span set"""
+    spans = {span for fast, slow, _ in params for span in (fast, slow)}
+    ema = {span: prices.ewm(span=span, adjust=False).mean() for span in spans}
+    macd = {(fast, slow): ema[fast] - ema[slow] for fast, slow, _ in params}
+    tensors = []
+    for fast, slow, span in params:
+        line = macd[(fast, slow)]
+        tensors.append(_compare(line.to_numpy(), line.ewm(span=span, adjust=False).mean().to_numpy()))
+    return np.stack(tensors, axis=-1)
+
+
+STRATEGIES = {'sma': sma_signals, 'rsi': rsi_signals, 'macd': macd_signals}
+
+
+def positions(signals: np.ndarray, axis: int = 0) -> np.ndarray:
+    """Long (1) from a buy to the next sell, flat (0) otherwise; hold keeps the last position"""
+    shape = [1] * signals.ndim
+    shape[axis] = -1
+    bars = np.arange(signals.shape[axis]).reshape(shape)
+    # Index of the latest bar with a buy or sell, -1 before the first one
+    last = np.maximum.accumulate(np.where(signals != HOLD, bars, -1), axis=axis)
+    long = np.take_along_axis(signals, np.maximum(last, 0), axis=axis) == BUY
+    return (long & (last >= 0)).astype(np.int8)
+
+
+def bar_returns(prices: pd.DataFrame) -> np.ndarray:
+    """Each bar's return over the one before, 0 where either price is missing"""
+    values = prices.to_numpy(dtype=float)
+    returns = np.zeros_like(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = values[1:] / values[:-1] - 1
+    returns[~np.isfinite(returns)] = 0.0
+    return returns
+
+
+def evaluate(prices: pd.DataFrame, signals: np.ndarray, cost: float = 0.0) -> Dict[str, np.ndarray]:
+    """Backtest a bars x companies x params signal tensor; every metric is companies x params
+
+    `cost` is charged as a fraction of equity each time the position changes.
+    hit_rate is the share of round trips (a run of bars in the market) that
+    made money; it is NaN for pairs that never traded.
+    """
+    # Running products and maxima along the first axis of a C-ordered
+    # array are many times slower than along the last, so the bars are
+    # moved to the last axis: companies x params x bars from here on
+    signals = np.ascontiguousarray(np.moveaxis(signals, 0, -1))
+    returns = np.ascontiguousarray(bar_returns(prices).T)[:, None, :]
+    position = positions(signals, axis=-1)
+    # The position held over each bar is the one taken at the previous close
+    held = np.zeros_like(position)
+    held[..., 1:] = position[..., :-1]
+
+    # edges[..., t] is held[t] - held[t - 1], with nothing held before the
+    # first bar or after the last: 1 where a position opens, -1 where it closes
+    companies, sets, bars = signals.shape
+    edges = np.zeros((companies, sets, bars + 1), dtype=np.int8)
+    edges[..., :-1] = held
+    edges[..., 1:] -= held
+
+    strategy = held * returns
+    if cost:
+        strategy -= cost * np.abs(edges[..., :-1])
+
+    equity = np.cumprod(1 + strategy, axis=-1)
+    if bars:
+        peak = np.maximum(np.maximum.accumulate(equity, axis=-1), 1.0)
+        total_return = equity[..., -1] - 1
+        max_drawdown = (equity / peak - 1).min(axis=-1)
+    else:
+        total_return = max_drawdown = np.zeros((companies, sets))
+
+    # Round trips are the runs of held bars: a run from bar s to bar e - 1
+    # returns equity[e - 1] / equity[s - 1] - 1. The edges come out in
+    # (company, params, bar) order, which pairs every entry with its exit.
+    company, param, entry = np.nonzero(edges == 1)
+    exit_ = np.nonzero(edges == -1)[2]
+    curve = np.concatenate([np.ones((companies, sets, 1)), equity], axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trade_returns = curve[company, param, exit_] / curve[company, param, entry] - 1
+    pair = company * sets + param
+    trades = np.bincount(pair, minlength=companies * sets).reshape(companies, sets)
+    wins = np.bincount(pair, weights=trade_returns > 0, minlength=companies * sets).reshape(companies, sets)
+
+    listed = np.maximum(prices.notna().to_numpy().sum(axis=0), 1)
+    with np.errstate(invalid='ignore'):
+        hit_rate = np.where(trades > 0, wins / trades, np.nan)
+    return {
+        'total_return': total_return,
+        'buy_and_hold': np.broadcast_to(np.prod(1 + returns, axis=-1) - 1, (companies, sets)),
+        'max_drawdown': max_drawdown,
+        'hit_rate': hit_rate,
+        'trades': trades,
+        'exposure': held.sum(axis=-1) / listed[:, None],
+    }
+
+
+def backtest(prices: pd.DataFrame, strategy: str, params: Sequence[tuple], cost: float = 0.0) -> pd.DataFrame:
+    """Backtest one strategy with every parameter set, one row per (strategy, params, company)"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    params = [tuple(p) for p in params]
+    index = pd.MultiIndex.from_product([[strategy], params, prices.columns],
+                                       names=['strategy', 'params', 'company'])
+    if not params or prices.empty:
+        return pd.DataFrame(index=index[:0], columns=METRICS, dtype=float)
+
+    metrics = evaluate(prices, STRATEGIES[strategy](prices, params), cost)
+    # (companies, params) -> params-major rows, matching the index
+    return pd.DataFrame({name: metrics[name].T.ravel() for name in METRICS}, index=index)
+
+
+# The price matrix of a sweep's worker process, sent once when it starts
+_worker_prices = None
+
+
+def _set_worker_prices(prices: pd.DataFrame):
+    global _worker_prices
+    _worker_prices = prices
+
+
+def _backtest_chunk(task) -> pd.DataFrame:
+    strategy, params, cost = task
+    return backtest(_worker_prices, strategy, params, cost)
+
+
+def sweep(prices: pd.DataFrame, grid: Dict[str, List[tuple]] = None, workers: int = None,
+          chunk_size: int = 4, cost: float = 0.0) -> pd.DataFrame:
+    """Backtest every strategy and parameter set of the grid (DEFAULT_GRID by default)
+
+    The grid is split into chunks of `chunk_size` parameter sets, which are
+    backtested by a pool of `workers` processes (one per CPU by default;
+    workers=1 runs them in this process). Smaller chunks spread the work
+    more evenly, larger ones share more indicator series.
+    """
+    grid = DEFAULT_GRID if grid is None else grid
+    tasks = [(strategy, list(params[i:i + chunk_size]), cost)
+             for strategy, params in grid.items()
+             for i in range(0, len(params), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(tasks) <= 1:
+        results = [backtest(prices, strategy, params, cost) for strategy, params, cost in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 initializer=_set_worker_prices, initargs=(prices,)) as pool:
+            results = list(pool.map(_backtest_chunk, tasks))
+
+    if not results:
+        return pd.DataFrame(columns=METRICS, dtype=float)
+    return pd.concat(results)
+
+
+def best(results: pd.DataFrame, metric: str = 'total_return') -> pd.DataFrame:
+    """The parameter sets of each strategy ranked by their median `metric` across companies"""
+    return (results.groupby(level=['strategy', 'params'])[METRICS].median()
+            .sort_values(['strategy', metric], ascending=[True, False]))
@@ -1,6 +1,17 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import Dict
+
+BUY, HOLD, SELL = 1, 0, -1
+SIGNAL_LABELS = np.array(['sell', 'hold', 'buy'], dtype=object)
+
+RESAMPLE_RULES = {'weekly': 'W', 'monthly': 'M'}
+RESAMPLE_AGG = {
+    'Last_Price': 'last',
+    'High': 'max',
+    'Low': 'min',
+    'Volume': 'sum'
+}
 
 class TechnicalAnalysis:
     def __init__(self, df: pd.DataFrame):
@@ -13,17 +24,41 @@ class TechnicalAnalysis:
             self.df.index = pd.to_datetime(self.df.index)
 
         self.df = self.df.sort_index()
+        # Indicator series by name and parameters. generate_signals(),
+        # analyze_all_periods() and the bands share them instead of
+        # recomputing; callers must not modify the returned series.
+        self._series = {}
+
+    @classmethod
+    def from_indexed(cls, df: pd.DataFrame) -> 'TechnicalAnalysis':
+        """Wrap a frame that already has a sorted DatetimeIndex, without copying it"""
+        analyzer = cls.__new__(cls)
+        analyzer.df = df
+        analyzer._series = {}
+        return analyzer
+
+    def _cached(self, key, compute):
+        if key not in self._series:
+            self._series[key] = compute()
+        return self._series[key]
 
     def calculate_sma(self, period: int) -> pd.Series:
         """Calculate Simple Moving Average"""
-        return self.df['Last_Price'].rolling(window=period).mean()
+        return self._cached(('sma', period), lambda: self.df['Last_Price'].rolling(window=period).mean())
 
     def calculate_ema(self, period: int) -> pd.Series:
         """Calculate Exponential Moving Average"""
-        return self.df['Last_Price'].ewm(span=period, adjust=False).mean()
+        return self._cached(('ema', period), lambda: self.df['Last_Price'].ewm(span=period, adjust=False).mean())
+
+    def calculate_std(self, period: int) -> pd.Series:
+        """Calculate the rolling standard deviation of the price"""
+        return self._cached(('std', period), lambda: self.df['Last_Price'].rolling(window=period).std())
 
     def calculate_rsi(self, period: int = 14) -> pd.Series:
         """Calculate Relative Strength Index with proper error handling"""
+        return self._cached(('rsi', period), lambda: self._calculate_rsi(period))
+
+    def _calculate_rsi(self, period: int) -> pd.Series:
         try:
             delta = self.df['Last_Price'].diff()
             gains = delta.where(delta > 0, 0.0)
@@ -43,9 +78,10 @@ class TechnicalAnalysis:
 
     def calculate_macd(self) -> Dict[str, pd.Series]:
         """Calculate MACD (Moving Average Convergence Divergence)"""
-        exp1 = self.df['Last_Price'].ewm(span=12, adjust=False).mean()
-        exp2 = self.df['Last_Price'].ewm(span=26, adjust=False).mean()
-        macd = exp1 - exp2
+        return self._cached(('macd',), self._calculate_macd)
+
+    def _calculate_macd(self) -> Dict[str, pd.Series]:
+        macd = self.calculate_ema(12) - self.calculate_ema(26)
         signal = macd.ewm(span=9, adjust=False).mean()
         hist = macd - signal
         return {'macd': macd, 'signal': signal, 'hist': hist}
@@ -53,7 +89,7 @@ class TechnicalAnalysis:
     def calculate_bollinger_bands(self, period: int = 20) -> Dict[str, pd.Series]:
         """Calculate Bollinger Bands"""
         sma = self.calculate_sma(period)
-        std = self.df['Last_Price'].rolling(window=period).std()
+        std = self.calculate_std(period)
         upper_band = sma + (std * 2)
         lower_band = sma - (std * 2)
         return {'middle': sma, 'upper': upper_band, 'lower': lower_band}
@@ -66,56 +102,65 @@ class TechnicalAnalysis:
         d = k.rolling(window=3).mean()
         return {'k': k, 'd': d}
 
-    def generate_signals(self) -> Dict[str, List[str]]:
-        """Generate trading signals based on technical indicators"""
-        signals = {
-            'sma': [],
-            'ema': [],
-            'rsi': [],
-            'macd': [],
-            'bollinger': []
-        }
-
-        sma20 = self.calculate_sma(20)
-        sma50 = self.calculate_sma(50)
-        signals['sma'] = ['buy' if sma20[i] > sma50[i] else 'sell' for i in range(len(sma20))]
-
-        rsi = self.calculate_rsi()
-        signals['rsi'] = ['buy' if r < 30 else 'sell' if r > 70 else 'hold' for r in rsi]
+    def signal_codes(self) -> Dict[str, np.ndarray]:
+        """Trading signals per bar as int8 arrays: 1 buy, 0 hold, -1 sell"""
+        def compare(above, below):
+            # NaN comparisons are False, so bars before a window fills are 'sell'
+            return np.where(above.to_numpy() > below.to_numpy(), BUY, SELL).astype(np.int8)
 
+        rsi = self.calculate_rsi().to_numpy()
         macd_data = self.calculate_macd()
-        signals['macd'] = ['buy' if macd_data['macd'][i] > macd_data['signal'][i]
-                           else 'sell' for i in range(len(macd_data['macd']))]
+        return {
+            'sma': compare(self.calculate_sma(20), self.calculate_sma(50)),
+            'rsi': np.select([rsi < 30, rsi > 70], [BUY, SELL], HOLD).astype(np.int8),
+            'macd': compare(macd_data['macd'], macd_data['signal'])
+        }
 
+    def generate_signals(self, latest: bool = False, changes: bool = False) -> Dict:
+        """Generate trading signals based on technical indicators
+
+        By default every bar's signal is returned as a Categorical of
+        'buy'/'hold'/'sell' (one int8 code per bar). latest=True returns only
+        the last bar's label, changes=True only the bars where the signal
+        differs from the bar before, as a Series of labels indexed by date.
+        """
+        codes = self.signal_codes()
+        signals = {}
+        for name in ('sma', 'ema', 'rsi', 'macd', 'bollinger'):
+            values = codes.get(name, np.empty(0, dtype=np.int8))
+            index = self.df.index if name in codes else self.df.index[:0]
+            if latest:
+                signals[name] = SIGNAL_LABELS[values[-1] - SELL] if len(values) else None
+            elif changes:
+                points = np.flatnonzero(np.r_[True, values[1:] != values[:-1]]) if len(values) else []
+                signals[name] = pd.Series(_signal_labels(values[points]), index=index[points])
+            else:
+                signals[name] = _signal_labels(values)
         return signals
 
-    def analyze_all_periods(self) -> Dict:
-        """Analyze data for different time periods (1 day, 1 week, 1 month)"""
+    def resample(self, rule: str) -> pd.DataFrame:
+        """Aggregate the daily bars into weekly ('W') or monthly ('M') OHLCV bars"""
+        return self.df.resample(rule).agg(RESAMPLE_AGG).dropna()
+
+    def analyze_all_periods(self, resampled: Dict[str, pd.DataFrame] = None) -> Dict:
+        """Analyze data for different time periods (1 day, 1 week, 1 month)
+
+        `resampled` can supply the weekly/monthly bars (e.g. from a
+        PeriodCache); missing ones are resampled from the daily data.
+        """
         try:
-            # Create resampled dataframes
-            weekly_df = self.df.resample('W').agg({
-                'Last_Price': 'last',
-                'High': 'max',
-                'Low': 'min',
-                'Volume': 'sum'
-            }).dropna()
-
-            monthly_df = self.df.resample('M').agg({
-                'Last_Price': 'last',
-                'High': 'max',
-                'Low': 'min',
-                'Volume': 'sum'
-            }).dropna()
-
-            periods = {
-                'daily': self.df,
-                'weekly': weekly_df,
-                'monthly': monthly_df
-            }
+            resampled = resampled or {}
+            # The daily analyzer is this one, so series already computed
+            # (e.g. by generate_signals) are reused
+            periods = {'daily': self}
+            for period_name, rule in RESAMPLE_RULES.items():
+                period_df = resampled.get(period_name)
+                if period_df is None:
+                    period_df = self.resample(rule)
+                periods[period_name] = TechnicalAnalysis.from_indexed(period_df)
 
             analysis = {}
-            for period_name, period_data in periods.items():
-                temp_analyzer = TechnicalAnalysis(period_data)
+            for period_name, temp_analyzer in periods.items():
                 analysis[period_name] = {
                     'sma20': temp_analyzer.calculate_sma(20).iloc[-1],
                     'ema20': temp_analyzer.calculate_ema(20).iloc[-1],
@@ -129,4 +174,56 @@ class TechnicalAnalysis:
             print(f"Error in analyze_all_periods: {str(e)}")
             import traceback
             print(traceback.format_exc())
-            return {}
\ No newline at end of file
+            return {}
+
+
+def _signal_labels(values: np.ndarray) -> pd.Categorical:
+    return pd.Categorical.from_codes(values.astype(np.int8) - SELL, categories=SIGNAL_LABELS)
+
+
+class PeriodCache:
+    """Weekly and monthly bars per company, kept across requests.
+
+    When new daily bars arrive, only the periods from the one holding the
+    previously seen last bar onwards are resampled again; earlier periods
+    are complete and reused. If earlier daily bars changed (their count or
+    totals differ), the company is resampled from scratch.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key, daily: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Return {'weekly': ..., 'monthly': ...} for a date-indexed, sorted daily frame"""
+        if daily.empty:
+            return {}
+        entry = self.entries.get(key)
+        last_date = daily.index[-1]
+
+        if entry is not None and entry['last_date'] <= last_date:
+            seen = daily.loc[:entry['last_date']]
+            if _fingerprint(seen) != entry['fingerprint']:
+                entry = None
+            elif entry['last_date'] == last_date:
+                return entry['periods']
+        else:
+            entry = None
+
+        periods = {}
+        for period_name, rule in RESAMPLE_RULES.items():
+            if entry is None:
+                periods[period_name] = daily.resample(rule).agg(RESAMPLE_AGG).dropna()
+                continue
+            # Periods labelled before the old last bar cannot receive new bars
+            previous = entry['periods'][period_name]
+            complete = previous[previous.index < entry['last_date']]
+            tail = daily if complete.empty else daily[daily.index > complete.index[-1]]
+            periods[period_name] = pd.concat([complete, tail.resample(rule).agg(RESAMPLE_AGG).dropna()])
+
+        self.entries[key] = {'last_date': last_date, 'fingerprint': _fingerprint(daily), 'periods': periods}
+        return periods
+
+
+def _fingerprint(daily: pd.DataFrame):
+    values = daily[list(RESAMPLE_AGG)].to_numpy(dtype=float, na_value=np.nan)
+    return len(daily), float(np.nansum(values))
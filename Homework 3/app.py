@@ -1,58 +1,79 @@
 from flask import Flask, render_template, jsonify
 import pandas as pd
 import os
+import sys
 from flask import send_from_directory
-from analysis.technical import TechnicalAnalysis
+from analysis.technical import PeriodCache, TechnicalAnalysis
+from dataset import DatasetCache
 
-app = Flask(__name__)
+# The storage layer lives next to the scraper that writes it
+HOMEWORK1_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Homework 1')
+sys.path.insert(0, HOMEWORK1_DIR)
+from mse_storage import find_store
+
+# The profiler is shared with the Homework 4 services
+HOMEWORK4_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Homework 4')
+sys.path.insert(0, HOMEWORK4_DIR)
+from common import profiler
 
-def load_data():
-    try:
-        # Print current directory for debugging
-        current_dir = os.getcwd()
-        print(f"Current working directory: {current_dir}")
-
-        # Try multiple possible locations for the CSV file
-        possible_locations = [
-            'mse_data.csv',  # Same directory
-            '../Homework 1/mse_data.csv',  # HW1 directory
-            os.path.join(current_dir, 'mse_data.csv'),  # Absolute path
-            os.path.join(current_dir, '../Homework 1/mse_data.csv')  # Absolute path to HW1
-        ]
-
-        df = None
-        used_path = None
-
-        for file_path in possible_locations:
-            print(f"Trying to load from: {file_path}")
-            if os.path.exists(file_path):
-                print(f"Found file at: {file_path}")
-                df = pd.read_csv(file_path)
-                used_path = file_path
-                break
-
-        if df is None:
-            print("Error: mse_data.csv not found in any of these locations:")
-            for loc in possible_locations:
-                print(f"- {loc}")
-            return pd.DataFrame()
-
-        print(f"Successfully loaded data from {used_path} with shape: {df.shape}")
-
-        # Data preprocessing
-        df['Date'] = pd.to_datetime(df['Date'])
-        df = df.sort_values('Date', ascending=False)
-
-        # Verify data is loaded correctly
-        print("Sample of loaded data:")
-        print(df.head())
-
-        return df
-    except Exception as e:
-        print(f"Error loading data: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        return pd.DataFrame()
+app = Flask(__name__)
+profiler.init_app(app)
+
+def get_store():
+    # Try multiple possible locations for the data store
+    current_dir = os.getcwd()
+    possible_locations = [
+        'mse_store',  # Same directory
+        os.path.join(HOMEWORK1_DIR, 'mse_store'),  # HW1 directory
+        os.path.join(current_dir, 'mse_store'),  # Absolute path
+        os.path.join(current_dir, '../Homework 1/mse_store')  # Absolute path to HW1
+    ]
+
+    store = find_store(possible_locations)
+    if store is None:
+        app.logger.error("mse_store not found in any of these locations: %s", ', '.join(possible_locations))
+    return store
+
+def read_dataset(store):
+    df = store.read_all()
+    app.logger.info("Loaded data from %s with shape %s", store.root, df.shape)
+    return df
+
+# Loaded once per process and swapped when the scraper publishes new data
+dataset = DatasetCache(get_store, read_dataset)
+# Weekly/monthly bars per company, extended as new daily bars come in
+period_cache = PeriodCache()
+
+def load_company_data(company):
+    """Return a single issuer's rows, sorted by Date descending."""
+    return dataset.get().company(company)
+
+# The store keeps unknown numbers as missing; the pages show them as 0
+DISPLAY_MISSING = {'Last_Price': 0.0, 'Change_Pct': 0.0, 'Volume': 0, 'High': 0.0, 'Low': 0.0}
+
+def as_float64(values):
+    """Widen a column to float64. float32 prices and changes are quoted to the
+    hundredth, so they are rounded back to it: a stored 1234.56 comes out as
+    1234.56 rather than 1234.56005859375, without a round trip through str."""
+    if values.dtype == 'float32':
+        return values.astype('float64').round(2)
+    return values.astype('float64')
+
+def history_records(company_df, date_format, fields, missing=None):
+    """Build the templates' list of row dicts from whole columns instead of iterrows().
+
+    `missing` maps a field to the value that replaces NaN in it.
+    """
+    missing = missing or {}
+    columns = [company_df['Date'].dt.strftime(date_format).tolist()]
+    for field in fields:
+        values = as_float64(company_df[field])
+        if field in missing:
+            values = values.astype(object).where(values.notna(), missing[field])
+        columns.append(values.tolist())
+
+    keys = ['Date'] + fields
+    return [dict(zip(keys, row)) for row in zip(*columns)]
 
 @app.template_filter('format_number')
 def format_number(value):
@@ -60,25 +81,25 @@ def format_number(value):
 
 @app.route('/')
 def home():
-    df = load_data()
-    if df.empty:
-        return "Error: Could not load data. Please check if mse_data.csv exists and is properly formatted."
+    data = dataset.get()
+    if data.df.empty:
+        return "Error: Could not load data. Please check if mse_store exists and is properly formatted."
 
-    companies = df['Company'].unique().tolist()[:9]
     company_data = []
     total_volume = 0
 
-    for company in companies:
-        company_df = df[df['Company'] == company].iloc[0]
-        total_volume += float(company_df['Volume'])
+    latest = data.latest(data.companies[:9])
+    records = history_records(latest, '%d.%m.%Y', list(DISPLAY_MISSING), missing=DISPLAY_MISSING)
+    for company, record in zip(latest['Company'], records):
+        total_volume += float(record['Volume'])
         company_data.append({
             'name': company,
-            'last_price': float(company_df['Last_Price']),
-            'change': float(company_df['Change_Pct']),
-            'volume': float(company_df['Volume']),
-            'date': company_df['Date'].strftime('%d.%m.%Y'),
-            'high': float(company_df['High']),
-            'low': float(company_df['Low'])
+            'last_price': record['Last_Price'],
+            'change': record['Change_Pct'],
+            'volume': float(record['Volume']),
+            'date': record['Date'],
+            'high': record['High'],
+            'low': record['Low']
         })
 
     return render_template('index.html',
@@ -87,26 +108,14 @@ def home():
 
 @app.route('/company/<company>')
 def company_detail(company):
-    print(f"Loading data for company: {company}")
-    df = load_data()
-
-    if df.empty:
-        return "Error: Could not load data"
-
-    company_df = df[df['Company'] == company].copy()
+    app.logger.debug("Loading data for company: %s", company)
+    company_df = load_company_data(company)
     if company_df.empty:
         return f"No data found for company {company}"
 
-    history = []
-    for _, row in company_df.iterrows():
-        history.append({
-            'Date': row['Date'].strftime('%d.%m.%Y'),
-            'Last_Price': float(row['Last_Price']),
-            'Change_Pct': float(row['Change_Pct']),
-            'Volume': float(row['Volume']),
-            'High': float(row['High']),
-            'Low': float(row['Low'])
-        })
+    history = history_records(company_df, '%d.%m.%Y',
+                              ['Last_Price', 'Change_Pct', 'Volume', 'High', 'Low'],
+                              missing=DISPLAY_MISSING)
 
     latest = history[0] if history else None
 
@@ -117,11 +126,7 @@ def company_detail(company):
 
 @app.route('/analysis/<company>')
 def technical_analysis(company):
-    df = load_data()
-    if df.empty:
-        return "Error: Could not load data"
-
-    company_df = df[df['Company'] == company].copy()
+    company_df = load_company_data(company)
     if company_df.empty:
         return f"No data found for company {company}"
 
@@ -130,19 +135,13 @@ def technical_analysis(company):
 
     # Calculate technical indicators
     analyzer = TechnicalAnalysis(company_df)
-    analysis = analyzer.analyze_all_periods()
+    analysis = analyzer.analyze_all_periods(period_cache.get(company, analyzer.df))
 
     # Prepare historical data for plotting
-    history = []
-    for _, row in company_df.iterrows():
-        history.append({
-            'Date': row['Date'].strftime('%Y-%m-%d'),
-            'Last_Price': float(row['Last_Price']) if not pd.isna(row['Last_Price']) else None,
-            'Volume': float(row['Volume']) if not pd.isna(row['Volume']) else 0,
-            'High': float(row['High']) if not pd.isna(row['High']) else None,
-            'Low': float(row['Low']) if not pd.isna(row['Low']) else None,
-            'Change_Pct': float(row['Change_Pct']) if not pd.isna(row['Change_Pct']) else 0
-        })
+    history = history_records(company_df, '%Y-%m-%d',
+                              ['Last_Price', 'Volume', 'High', 'Low', 'Change_Pct'],
+                              missing={'Last_Price': None, 'Volume': 0, 'High': None,
+                                       'Low': None, 'Change_Pct': 0})
 
     return render_template('analysis.html',
                          company=company,
@@ -156,7 +155,8 @@ def serve_static(filename):
 @app.route('/api/debug')
 def debug_info():
     """Endpoint to check data loading and formatting"""
-    df = load_data()
+    data = dataset.get()
+    df = data.df
     if df.empty:
         return jsonify({
             "error": "No data loaded",
@@ -167,8 +167,8 @@ def debug_info():
     return jsonify({
         "data_shape": df.shape,
         "columns": df.columns.tolist(),
-        "sample_data": df.head(1).to_dict('records'),
-        "companies": df['Company'].unique().tolist()[:5]
+        "sample_data": df.head(1).astype(object).where(df.head(1).notna(), None).to_dict('records'),
+        "companies": data.companies[:5]
     })
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class IndexedDataset:
+    """The dataset sorted into one contiguous, newest-first block per company.
+
+    `index` maps each company to the slice of its block, so looking up an
+    issuer is a dict access plus a positional slice instead of a scan.
+    """
+
+    def __init__(self, df):
+        if df.empty:
+            self.df, self.index, self.companies = df, {}, []
+            return
+
+        df = df.sort_values(['Company', 'Date'], ascending=[True, False], kind='mergesort')
+        self.df = df.reset_index(drop=True)
+
+        codes = self.df['Company'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        stops = np.r_[starts[1:], len(codes)]
+        self.index = {codes[start]: slice(start, stop) for start, stop in zip(starts, stops)}
+
+        # Most recently traded companies first, like the date-sorted frame used to list them
+        latest = self.df['Date'].to_numpy()[starts]
+        order = np.argsort(-latest.astype('int64'), kind='stable')
+        self.companies = [codes[starts[i]] for i in order]
+
+    def company(self, company):
+        """Return the company's rows (newest first), or an empty frame."""
+        rows = self.index.get(company)
+        if rows is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[rows]
+
+    def latest(self, companies):
+        """Return the newest row of each company, in the given order."""
+        positions = [self.index[company].start for company in companies if company in self.index]
+        return self.df.iloc[positions]
+
+
+class DatasetCache:
+    """Process-wide copy of the dataset that reloads when the store changes.
+
+    Every call to get() costs at most one stat() of the store manifest, and
+    only once per `check_interval` seconds. When the manifest's mtime or size
+    changes, a single thread loads and indexes the new frame and swaps it in
+    with one assignment, so concurrent requests see either the old or the
+    new IndexedDataset, never a partially loaded one.
+    """
+
+    def __init__(self, locate_store, load, check_interval=1.0):
+        self.locate_store = locate_store
+        self.load = load
+        self.check_interval = check_interval
+        self.store = None
+        self.data = IndexedDataset(pd.DataFrame())
+        self.signature = None
+        self.version = 0
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+    def _manifest_signature(self):
+        if self.store is None:
+            self.store = self.locate_store()
+            if self.store is None:
+                return None
+        try:
+            stat = os.stat(self.store.manifest_path())
+        except FileNotFoundError:
+            self.store = None
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        if time.monotonic() - self.last_check < self.check_interval:
+            return self.data
+
+        # Only one thread reloads; the others keep serving the current frame
+        if not self.lock.acquire(blocking=self.signature is None):
+            return self.data
+        try:
+            if time.monotonic() - self.last_check >= self.check_interval:
+                signature = self._manifest_signature()
+                if signature is not None and signature != self.signature:
+                    self._reload(signature)
+                self.last_check = time.monotonic()
+        finally:
+            self.lock.release()
+        return self.data
+
+    def _reload(self, signature):
+        try:
+            data = IndexedDataset(self.load(self.store))
+        except Exception:
+            # Keep serving the previous frame; the next check retries
+            logger.exception("Error loading data from %s", self.store.root)
+            return
+        self.data, self.signature = data, signature
+        self.version += 1
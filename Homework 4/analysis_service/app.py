@@ -1,14 +1,60 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+import logging
+import numpy as np
 import pandas as pd
-import requests
 import os
+import sys
+import threading
+
+# The modules the services share live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import metrics, profiler, wire
+from common.conditional import versioned
+from common.cross_section import align_latest, analyze_matrix
+from common.http_client import ServiceClient
+from common.metrics import stage
+from incremental import IndicatorState, StateStore
+from result_cache import VersionedLRUCache
 from strategies import AnalysisFactory
 
 app = Flask(__name__)
+metrics.init_app(app, 'analysis_service')
+profiler.init_app(app)
 CORS(app)
+logger = logging.getLogger(__name__)
 
 DATA_SERVICE_URL = os.environ.get('DATA_SERVICE_URL', 'http://localhost:5002')
+# The strategies only read Last_Price, and their longest window/EMA span
+# is covered many times over by this many of the most recent rows
+HISTORY_ROWS = int(os.environ.get('ANALYSIS_HISTORY_ROWS', 500))
+
+data_client = ServiceClient(DATA_SERVICE_URL)
+# History comes as packed column arrays (see common/wire.py); JSON is the fallback
+HISTORY_ACCEPT = f'{wire.MEDIA_TYPE}, application/json;q=0.5'
+
+
+def fetch_data_version():
+    response = data_client.get('/api/version')
+    response.raise_for_status()
+    return str(response.json()['version'])
+
+
+# Results only change when the scraper publishes new data, so they are
+# cached per company until the data service reports a new version
+result_cache = VersionedLRUCache(fetch_data_version,
+                                 maxsize=int(os.environ.get('ANALYSIS_CACHE_SIZE', 256)),
+                                 ttl=float(os.environ.get('DATA_VERSION_TTL', 5)))
+# ...and clients that already have a result are answered with a 304
+data_versioned = versioned(result_cache.version)
+
+# Indicators are kept as per-company rolling state and only fed the bars
+# published since the last request; ANALYSIS_INCREMENTAL=0 recomputes them
+# from the last HISTORY_ROWS rows every time instead
+INCREMENTAL = os.environ.get('ANALYSIS_INCREMENTAL', '1') != '0'
+state_store = StateStore(os.environ.get('ANALYSIS_STATE_DIR', 'analysis_state'))
+states = {}
+states_lock = threading.Lock()
 
 
 @app.route('/api/health')
@@ -16,59 +62,174 @@ def health_check():
     return jsonify({'status': 'healthy'})
 
 
+def fetch_history(company, params):
+    """Fetch the Date (datetime64[D]) and Last_Price columns, newest first, and their data version."""
+    with stage('fetch'):
+        response = data_client.get(f'/api/company/{company}',
+                                   params={'fields': 'Last_Price', **params},
+                                   headers={'Accept': HISTORY_ACCEPT})
+    if response.status_code != 200:
+        raise LookupError('Failed to fetch company data')
+
+    with stage('decode'):
+        if response.headers.get('Content-Type', '').startswith(wire.MEDIA_TYPE):
+            columns, _, _ = wire.unpack(response.content)
+            dates = columns['Date'].astype('datetime64[D]')
+            prices = wire.widen(columns['Last_Price'])
+        else:
+            history = response.json().get('history') or []
+            dates = np.array([row['Date'] for row in history], dtype='datetime64[D]')
+            prices = np.array([row['Last_Price'] for row in history], dtype=float)
+    return dates, prices, response.headers.get('X-Data-Version')
+
+
+def batch_analysis(company):
+    dates, prices, version = fetch_history(company, {'limit': HISTORY_ROWS})
+    if not len(dates):
+        raise LookupError('No historical data available')
+
+    with stage('decode'):
+        df = pd.DataFrame({'Date': dates[::-1], 'Last_Price': prices[::-1]})
+
+    pipeline = AnalysisFactory.create_pipeline(['sma', 'rsi', 'macd', 'bollinger'])
+    results = pipeline.run(df)
+
+    sma, macd_data = results['sma'].get('sma', {}), results['macd'].get('macd', {})
+    daily_analysis = {
+        'sma20': sma.get('sma20'),
+        'ema20': sma.get('ema20'),
+        'rsi': results['rsi'].get('rsi', {}).get('rsi'),
+        'macd': macd_data.get('macd'),
+        'signal': macd_data.get('signal'),
+        'histogram': macd_data.get('histogram'),
+        'bollinger': results['bollinger'].get('bollinger', {})
+    }
+
+    return daily_analysis, version
+
+
+def oldest_first(dates, prices):
+    """Turn newest-first columns into the YYYY-MM-DD dates and float prices the state is fed."""
+    return np.datetime_as_string(dates[::-1], unit='D').tolist(), prices[::-1].tolist()
+
+
+def incremental_analysis(company):
+    """Bring the company's indicator state up to date with only the bars it has not seen."""
+    state = states.get(company) or state_store.load(company)
+    dates, prices, version = [], [], None
+    if state is not None:
+        # The range starts at the last bar seen, to notice if that bar was revised
+        dates, prices, version = fetch_history(company, {'from': state.last_date})
+        dates, prices = oldest_first(dates, prices)
+        if not dates or dates[0] != state.last_date or prices[0] != state.last_price:
+            state = None
+
+    if state is None:
+        dates, prices, version = fetch_history(company, {'limit': HISTORY_ROWS})
+        if not len(dates):
+            raise LookupError('No historical data available')
+        dates, prices = oldest_first(dates, prices)
+        state = IndicatorState()
+
+    with states_lock:
+        with stage('compute'):
+            applied = state.extend(dates, prices)
+        if applied:
+            with stage('persist'):
+                state_store.save(company, state)
+        states[company] = state
+        return state.snapshot(), version
+
+
 @app.route('/api/analysis/<company>')
+@data_versioned
 def analyze_company(company):
     try:
-        response = requests.get(f'{DATA_SERVICE_URL}/api/company/{company}', timeout=10)
-
+        cached = result_cache.get(company, result_cache.version())
+        if cached is not None:
+            return jsonify(cached)
+
+        analysis = incremental_analysis if INCREMENTAL else batch_analysis
+        try:
+            daily_analysis, version = analysis(company)
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+
+        result = {'daily': daily_analysis}
+        result_cache.put(company, version, result)
+        with stage('serialize'):
+            return jsonify(result)
+
+    except Exception:
+        logger.exception("Analysis of %s failed", company)
+        return jsonify({'error': 'Analysis failed'}), 500
+
+
+def daily_record(values):
+    """Shape one row of analyze_matrix() like the 'daily' analysis of a single company."""
+    return {
+        'sma20': values['sma20'],
+        'ema20': values['ema20'],
+        'rsi': values['rsi'],
+        'macd': values['macd'],
+        'signal': values['signal'],
+        'histogram': values['histogram'],
+        'bollinger': {
+            'middle': values['bollinger_middle'],
+            'upper': values['bollinger_upper'],
+            'lower': values['bollinger_lower']
+        }
+    }
+
+
+@app.route('/api/analysis/batch')
+@data_versioned
+def analyze_batch():
+    """Latest indicators of ?companies=A,B,C (default: all) from one fetch and one matrix pass."""
+    try:
+        # The data service would repeat a company named twice, and the result is keyed by company
+        names = ','.join(dict.fromkeys(name.strip() for name in request.args.get('companies', '').split(',')
+                                       if name.strip()))
+        key = f'batch:{names}'
+        cached = result_cache.get(key, result_cache.version())
+        if cached is not None:
+            return jsonify(cached)
+
+        params = {'fields': 'Last_Price', 'limit': HISTORY_ROWS}
+        if names:
+            params['companies'] = names
+        with stage('fetch'):
+            response = data_client.get('/api/market/history', params=params,
+                                       headers={'Accept': HISTORY_ACCEPT})
         if response.status_code != 200:
-            return jsonify({'error': 'Failed to fetch company data'}), 404
-
-        data = response.json()
-        if not data.get('history'):
-            return jsonify({'error': 'No historical data available'}), 404
-
-        df = pd.DataFrame(data['history'])
-        df['Date'] = pd.to_datetime(df['Date'])
-        df = df.sort_values('Date')
-
-        numeric_columns = ['Last_Price', 'Change_Pct', 'Volume', 'High', 'Low']
-        for col in numeric_columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        factory = AnalysisFactory()
-        strategies = ['sma', 'rsi', 'macd', 'bollinger']
-        daily_analysis = {}
-
-        for strategy_name in strategies:
-            try:
-                strategy = factory.create_strategy(strategy_name)
-                result = strategy.analyze(df)
-
-                if strategy_name == 'sma':
-                    daily_analysis.update({
-                        'sma20': result.get('sma', {}).get('sma20'),
-                        'ema20': result.get('sma', {}).get('ema20')
-                    })
-                elif strategy_name == 'rsi':
-                    daily_analysis['rsi'] = result.get('rsi', {}).get('rsi')
-                elif strategy_name == 'macd':
-                    macd_data = result.get('macd', {})
-                    daily_analysis.update({
-                        'macd': macd_data.get('macd'),
-                        'signal': macd_data.get('signal'),
-                        'histogram': macd_data.get('histogram')
-                    })
-                elif strategy_name == 'bollinger':
-                    daily_analysis['bollinger'] = result.get('bollinger', {})
-
-            except Exception:
-                continue
-
-        return jsonify({'daily': daily_analysis})
-
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+            return jsonify({'error': 'Failed to fetch market data'}), 404
+
+        with stage('decode'):
+            if response.headers.get('Content-Type', '').startswith(wire.MEDIA_TYPE):
+                columns, _, data = wire.unpack(response.content)
+                prices = wire.widen(columns['Last_Price'])
+            else:
+                data = response.json()
+                prices = np.asarray(data['history']['Last_Price'], dtype=float)
+
+            # Each company's block is newest first, so a row's rank is its offset in the block
+            lengths = np.asarray(data['lengths'], dtype=np.int64)
+            codes = np.repeat(np.arange(len(lengths)), lengths)
+            ranks = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            matrix = align_latest(codes, ranks, prices, data['companies'])
+
+        with stage('compute'):
+            latest = analyze_matrix(matrix)
+        with stage('serialize'):
+            latest = latest.astype(object).where(latest.notna(), None)
+            result = {'companies': {company: daily_record(values)
+                                    for company, values in latest.to_dict('index').items()}}
+            result_cache.put(key, response.headers.get('X-Data-Version'), result)
+            return jsonify(result)
+
+    except Exception:
+        logger.exception("Batch analysis failed")
+        return jsonify({'error': 'Analysis failed'}), 500
 
 
 if __name__ == '__main__':
@@ -0,0 +1,289 @@
+"""Incremental indicator engine.
+
+Keeps the rolling state behind every indicator the analysis service
+reports, so a new daily bar is folded in with O(1) work instead of
+recomputing each indicator over the whole history:
+
+    SMA        running sum over a fixed window
+    EMA/MACD   last EMA value of each span (pandas ewm, adjust=False)
+    RSI        running sums of gains and losses over the window, the same
+               simple-average RSI the batch strategies compute
+    Bollinger  Welford mean/variance over the window (sample std, ddof=1)
+
+Results match the batch strategies to floating-point tolerance. Running
+sums are re-summed from their window once per window length, which keeps
+rounding drift bounded at amortized O(1) cost.
+
+States serialize to JSON and are persisted per company by StateStore, so
+after a restart only the bars published since the last update are fetched.
+"""
+import json
+import logging
+import math
+import os
+from collections import deque
+
+SMA_PERIODS = (20, 50)
+EMA_SPANS = (12, 20, 26)
+MACD_SIGNAL_SPAN = 9
+RSI_PERIOD = 14
+BOLLINGER_PERIOD = 20
+
+logger = logging.getLogger(__name__)
+
+
+def _finite(value):
+    return value if value is not None and math.isfinite(value) else None
+
+
+class RollingSum:
+    """Sum of the last `window` values."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.nonzero = 0
+        self.since_resync = 0
+
+    def push(self, value):
+        self.values.append(value)
+        self.total += value
+        self.nonzero += value != 0
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            self.total -= old
+            self.nonzero -= old != 0
+
+        self.since_resync += 1
+        if self.nonzero == 0:
+            # An all-zero window must sum to exactly 0 (RSI tells 0 apart from tiny)
+            self.total = 0.0
+        elif self.since_resync >= self.window:
+            self.total = math.fsum(self.values)
+            self.since_resync = 0
+
+    def mean(self):
+        if len(self.values) < self.window:
+            return None
+        return self.total / self.window
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values)}
+
+    @classmethod
+    def from_dict(cls, state):
+        rolling = cls(state['window'])
+        rolling.values = deque(state['values'])
+        rolling.total = math.fsum(rolling.values)
+        rolling.nonzero = sum(value != 0 for value in rolling.values)
+        return rolling
+
+
+class RollingStats:
+    """Welford mean and sample variance of the last `window` values."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.since_resync = 0
+
+    def push(self, value):
+        self.values.append(value)
+        if len(self.values) <= self.window:
+            delta = value - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (value - self.mean)
+        else:
+            # Replace the oldest value, keeping the count fixed
+            old = self.values.popleft()
+            old_mean = self.mean
+            self.mean += (value - old) / self.window
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+
+        self.since_resync += 1
+        if self.since_resync >= self.window:
+            self._resync()
+
+    def _resync(self):
+        self.mean = math.fsum(self.values) / len(self.values)
+        self.m2 = math.fsum((value - self.mean) ** 2 for value in self.values)
+        self.since_resync = 0
+
+    def std(self):
+        if len(self.values) < self.window:
+            return None
+        return math.sqrt(max(self.m2, 0.0) / (self.window - 1))
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values)}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls(state['window'])
+        stats.values = deque(state['values'])
+        if stats.values:
+            stats._resync()
+        return stats
+
+
+class EMA:
+    """Exponential moving average with adjust=False, seeded with the first value."""
+
+    def __init__(self, span, value=None):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = value
+
+    def push(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value = self.value + self.alpha * (value - self.value)
+        return self.value
+
+    def to_dict(self):
+        return {'span': self.span, 'value': self.value}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['span'], state['value'])
+
+
+class IndicatorState:
+    """Rolling state of one company's daily indicators, updated bar by bar."""
+
+    def __init__(self):
+        self.last_date = None
+        self.last_price = None
+        self.bars = 0
+        self.sma = {period: RollingSum(period) for period in SMA_PERIODS}
+        self.ema = {span: EMA(span) for span in EMA_SPANS}
+        self.macd_signal = EMA(MACD_SIGNAL_SPAN)
+        self.gains = RollingSum(RSI_PERIOD)
+        self.losses = RollingSum(RSI_PERIOD)
+        self.bollinger = RollingStats(BOLLINGER_PERIOD)
+
+    @classmethod
+    def from_history(cls, dates, prices):
+        """Build the state by replaying a history, oldest bar first."""
+        state = cls()
+        state.extend(dates, prices)
+        return state
+
+    def extend(self, dates, prices):
+        """Apply every bar newer than the last one seen; returns the number applied."""
+        applied = 0
+        for date, price in zip(dates, prices):
+            if self.update(date, price):
+                applied += 1
+        return applied
+
+    def update(self, date, price):
+        """Fold in one bar in O(1). Bars that are not newer, or have no price, are skipped."""
+        if price is None or not math.isfinite(price):
+            return False
+        if self.last_date is not None and date <= self.last_date:
+            return False
+
+        # The first bar has no change; the batch RSI counts it as a zero gain and loss
+        delta = 0.0 if self.last_price is None else price - self.last_price
+        self.gains.push(delta if delta > 0 else 0.0)
+        self.losses.push(-delta if delta < 0 else 0.0)
+
+        for rolling in self.sma.values():
+            rolling.push(price)
+        for ema in self.ema.values():
+            ema.push(price)
+        self.macd_signal.push(self.ema[12].value - self.ema[26].value)
+        self.bollinger.push(price)
+
+        self.last_date = date
+        self.last_price = price
+        self.bars += 1
+        return True
+
+    def rsi(self):
+        avg_gain, avg_loss = self.gains.mean(), self.losses.mean()
+        if avg_gain is None or (avg_gain == 0 and avg_loss == 0):
+            return 50.0
+        if avg_loss == 0:
+            return 100.0
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+    def snapshot(self):
+        """Return the latest values in the shape of the service's 'daily' analysis."""
+        if self.bars == 0:
+            return {}
+        macd = self.ema[12].value - self.ema[26].value
+        middle = self.sma[BOLLINGER_PERIOD].mean()
+        std = self.bollinger.std()
+        bollinger = {'middle': middle, 'upper': None, 'lower': None}
+        if middle is not None and std is not None:
+            bollinger.update(upper=middle + std * 2, lower=middle - std * 2)
+
+        return {
+            'sma20': _finite(self.sma[20].mean()),
+            'ema20': _finite(self.ema[20].value),
+            'rsi': _finite(self.rsi()),
+            'macd': _finite(macd),
+            'signal': _finite(self.macd_signal.value),
+            'histogram': _finite(macd - self.macd_signal.value),
+            'bollinger': {key: _finite(value) for key, value in bollinger.items()},
+        }
+
+    def to_dict(self):
+        return {
+            'last_date': self.last_date,
+            'last_price': self.last_price,
+            'bars': self.bars,
+            'sma': [rolling.to_dict() for rolling in self.sma.values()],
+            'ema': [ema.to_dict() for ema in self.ema.values()],
+            'macd_signal': self.macd_signal.to_dict(),
+            'gains': self.gains.to_dict(),
+            'losses': self.losses.to_dict(),
+            'bollinger': self.bollinger.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.last_date = data['last_date']
+        state.last_price = data['last_price']
+        state.bars = data['bars']
+        state.sma = {item['window']: RollingSum.from_dict(item) for item in data['sma']}
+        state.ema = {item['span']: EMA.from_dict(item) for item in data['ema']}
+        state.macd_signal = EMA.from_dict(data['macd_signal'])
+        state.gains = RollingSum.from_dict(data['gains'])
+        state.losses = RollingSum.from_dict(data['losses'])
+        state.bollinger = RollingStats.from_dict(data['bollinger'])
+        return state
+
+
+class StateStore:
+    """One JSON file of IndicatorState per company, written atomically."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, company):
+        return os.path.join(self.root, f'{company}.json')
+
+    def load(self, company):
+        try:
+            with open(self._path(company), encoding='utf-8') as f:
+                return IndicatorState.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            logger.exception("Discarding unreadable indicator state for %s", company)
+            return None
+
+    def save(self, company, state):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(company)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state.to_dict(), f)
+        os.replace(path + '.tmp', path)
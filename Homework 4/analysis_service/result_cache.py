@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class VersionedLRUCache:
+    """LRU cache of analysis results, keyed by company (or batch query) and data version.
+
+    The current data version is polled from the data service at most once
+    every `ttl` seconds. When it changes, every cached result belongs to
+    the old data, so the cache is emptied.
+    """
+
+    def __init__(self, fetch_version, maxsize=256, ttl=5.0):
+        self.fetch_version = fetch_version
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.current_version = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def version(self):
+        """Return the current data version, or None if the data service can't tell."""
+        if time.monotonic() - self.checked_at < self.ttl:
+            return self.current_version
+        try:
+            version = self.fetch_version()
+        except Exception:
+            version = None
+        with self.lock:
+            if version != self.current_version:
+                self.entries.clear()
+            self.current_version = version
+            self.checked_at = time.monotonic()
+        return version
+
+    def get(self, company, version):
+        if version is None:
+            return None
+        with self.lock:
+            key = (company, version)
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, company, version, value):
+        if version is None:
+            return
+        with self.lock:
+            self.entries[(company, version)] = value
+            self.entries.move_to_end((company, version))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -1,9 +1,35 @@
+import pandas as pd
+from common.metrics import stage
 from .base import AnalysisStrategy
+from .graph import SeriesGraph
 from .sma_strategy import SMAStrategy
 from .rsi_strategy import RSIStrategy
 from .macd_strategy import MACDStrategy
 from .bollinger_strategy import BollingerStrategy
 
+class AnalysisPipeline:
+    """Runs several strategies over one SeriesGraph, so every base series
+    they have in common (diffs, rolling windows, EMAs) is computed once."""
+
+    def __init__(self, strategies: dict):
+        self.strategies = strategies
+
+    def run(self, data: pd.DataFrame) -> dict:
+        graph = SeriesGraph(data)
+        try:
+            # The shared series are computed here, so a strategy's own
+            # stage only covers what it adds on top of them
+            with stage('compute_shared'):
+                graph.prepare(node for strategy in self.strategies.values() for node in strategy.requires())
+        except Exception:
+            # Each strategy reports its own failure from analyze()
+            pass
+        results = {}
+        for name, strategy in self.strategies.items():
+            with stage(f'compute_{name}'):
+                results[name] = strategy.analyze(data, graph)
+        return results
+
 class AnalysisFactory:
     @staticmethod
     def create_strategy(strategy_type: str) -> AnalysisStrategy:
@@ -18,4 +44,8 @@ class AnalysisFactory:
         if not strategy_class:
             raise ValueError(f"Unknown strategy type: {strategy_type}")
 
-        return strategy_class()
\ No newline at end of file
+        return strategy_class()
+
+    @staticmethod
+    def create_pipeline(strategy_types: list) -> AnalysisPipeline:
+        return AnalysisPipeline({name: AnalysisFactory.create_strategy(name) for name in strategy_types})
\ No newline at end of file
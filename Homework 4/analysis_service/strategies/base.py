@@ -1,13 +1,24 @@
 from abc import ABC, abstractmethod
 import pandas as pd
+from .graph import SeriesGraph
 
 class AnalysisStrategy(ABC):
+    def requires(self) -> list:
+        """
+        Base series this strategy reads from the shared SeriesGraph
+        Returns:
+            list: Graph nodes, e.g. [('rolling_mean', 20), ('ema', 12)]
+        """
+        return []
+
     @abstractmethod
-    def analyze(self, data: pd.DataFrame) -> dict:
+    def analyze(self, data: pd.DataFrame, graph: SeriesGraph = None) -> dict:
         """
         Analyze the given data and return results
         Args:
             data (pd.DataFrame): DataFrame with columns Date, Last_Price, etc.
+            graph (SeriesGraph): Base series shared with other strategies;
+                a private one is built when omitted
         Returns:
             dict: Analysis results
         """
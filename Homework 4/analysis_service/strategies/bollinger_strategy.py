@@ -1,12 +1,18 @@
 from .base import AnalysisStrategy
+from .graph import SeriesGraph
 import pandas as pd
 
 class BollingerStrategy(AnalysisStrategy):
-    def analyze(self, data: pd.DataFrame) -> dict:
+    period = 20
+
+    def requires(self) -> list:
+        return [('rolling_mean', self.period), ('rolling_std', self.period)]
+
+    def analyze(self, data: pd.DataFrame, graph: SeriesGraph = None) -> dict:
         try:
-            period = 20
-            sma = data['Last_Price'].rolling(window=period).mean()
-            std = data['Last_Price'].rolling(window=period).std()
+            graph = graph or SeriesGraph(data)
+            sma = graph.get('rolling_mean', self.period)
+            std = graph.get('rolling_std', self.period)
             upper_band = sma + (std * 2)
             lower_band = sma - (std * 2)
 
@@ -0,0 +1,58 @@
+import pandas as pd
+
+PRICE = ('price',)
+
+
+class SeriesGraph:
+    """Base series derived from one price column, each computed at most once.
+
+    A node is a tuple naming a series and its parameters, e.g.
+    ('rolling_mean', 20), ('ema', 12) or ('ema', 9, ('macd', 12, 26)). The
+    last element may name the source node; it defaults to the price column.
+    Strategies declare the nodes they read in requires() and fetch them with
+    get(), so strategies that need the same series share one computation.
+    """
+
+    def __init__(self, data: pd.DataFrame, column: str = 'Last_Price'):
+        self.data = data
+        self.column = column
+        self.values = {}
+
+    def get(self, name, *args):
+        if args and args[-1] == PRICE:
+            args = args[:-1]
+        key = (name,) + args
+        if key not in self.values:
+            self.values[key] = getattr(self, '_' + name)(*args)
+        return self.values[key]
+
+    def prepare(self, nodes):
+        """Compute every node up front; repeated nodes are computed once."""
+        for node in nodes:
+            self.get(*node)
+
+    def _price(self):
+        return self.data[self.column]
+
+    def _diff(self):
+        return self.get('price').diff()
+
+    def _gains(self):
+        delta = self.get('diff')
+        return delta.where(delta > 0, 0.0)
+
+    def _losses(self):
+        delta = self.get('diff')
+        return -delta.where(delta < 0, 0.0)
+
+    def _rolling_mean(self, window, source=PRICE):
+        return self.get(*source).rolling(window=window).mean()
+
+    def _rolling_std(self, window, source=PRICE):
+        return self.get(*source).rolling(window=window).std()
+
+    def _ema(self, span, source=PRICE):
+        return self.get(*source).ewm(span=span, adjust=False).mean()
+
+    def _macd(self, fast, slow):
+        return self.get('ema', fast) - self.get('ema', slow)
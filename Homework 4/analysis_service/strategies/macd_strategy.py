@@ -1,13 +1,16 @@
 from .base import AnalysisStrategy
+from .graph import SeriesGraph
 import pandas as pd
 
 class MACDStrategy(AnalysisStrategy):
-    def analyze(self, data: pd.DataFrame) -> dict:
+    def requires(self) -> list:
+        return [('macd', 12, 26), ('ema', 9, ('macd', 12, 26))]
+
+    def analyze(self, data: pd.DataFrame, graph: SeriesGraph = None) -> dict:
         try:
-            exp1 = data['Last_Price'].ewm(span=12, adjust=False).mean()
-            exp2 = data['Last_Price'].ewm(span=26, adjust=False).mean()
-            macd = exp1 - exp2
-            signal = macd.ewm(span=9, adjust=False).mean()
+            graph = graph or SeriesGraph(data)
+            macd = graph.get('macd', 12, 26)
+            signal = graph.get('ema', 9, ('macd', 12, 26))
             histogram = macd - signal
 
             return {
@@ -1,21 +1,24 @@
 from .base import AnalysisStrategy
+from .graph import SeriesGraph
 import pandas as pd
 
 class RSIStrategy(AnalysisStrategy):
-    def analyze(self, data: pd.DataFrame) -> dict:
+    period = 14
+
+    def requires(self) -> list:
+        return [('rolling_mean', self.period, ('gains',)), ('rolling_mean', self.period, ('losses',))]
+
+    def analyze(self, data: pd.DataFrame, graph: SeriesGraph = None) -> dict:
         try:
-            rsi = self._calculate_rsi(data)
+            rsi = self._calculate_rsi(graph or SeriesGraph(data), self.period)
             current_rsi = float(rsi.iloc[-1]) if not pd.isna(rsi.iloc[-1]) else None
             return {'rsi': {'rsi': current_rsi}}
         except Exception:
             return {'rsi': {}}
 
-    def _calculate_rsi(self, data: pd.DataFrame, period: int = 14) -> pd.Series:
-        delta = data['Last_Price'].diff()
-        gains = delta.where(delta > 0, 0.0)
-        losses = -delta.where(delta < 0, 0.0)
-        avg_gains = gains.rolling(window=period).mean()
-        avg_losses = losses.rolling(window=period).mean()
+    def _calculate_rsi(self, graph: SeriesGraph, period: int = 14) -> pd.Series:
+        avg_gains = graph.get('rolling_mean', period, ('gains',))
+        avg_losses = graph.get('rolling_mean', period, ('losses',))
         rs = avg_gains / avg_losses
         rsi = 100 - (100 / (1 + rs))
         return rsi.fillna(50)
\ No newline at end of file
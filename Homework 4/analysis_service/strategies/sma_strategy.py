@@ -1,12 +1,17 @@
 from .base import AnalysisStrategy
+from .graph import SeriesGraph
 import pandas as pd
 
 class SMAStrategy(AnalysisStrategy):
-    def analyze(self, data: pd.DataFrame) -> dict:
+    def requires(self) -> list:
+        return [('rolling_mean', 20), ('rolling_mean', 50), ('ema', 20)]
+
+    def analyze(self, data: pd.DataFrame, graph: SeriesGraph = None) -> dict:
         try:
-            sma20 = data['Last_Price'].rolling(window=20).mean().iloc[-1]
-            sma50 = data['Last_Price'].rolling(window=50).mean().iloc[-1]
-            ema20 = data['Last_Price'].ewm(span=20, adjust=False).mean().iloc[-1]
+            graph = graph or SeriesGraph(data)
+            sma20 = graph.get('rolling_mean', 20).iloc[-1]
+            sma50 = graph.get('rolling_mean', 50).iloc[-1]
+            ema20 = graph.get('ema', 20).iloc[-1]
 
             return {
                 'sma': {
@@ -0,0 +1,6 @@
+"""Modules shared by the services.
+
+Each service's image is built from the Homework 4 directory (see
+docker-compose.yml) and gets a copy of this package next to its own
+directory, as it is laid out here.
+"""
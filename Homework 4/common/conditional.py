@@ -0,0 +1,93 @@
+"""Conditional requests and compression for the JSON endpoints.
+
+Every response of an endpoint wrapped with versioned() is a function of
+the data version, so its strong ETag is derived from that version. A
+request whose If-None-Match still matches gets a 304 before the view even
+runs, and the client reuses the body it already has. Bodies of at least
+COMPRESS_MIN_SIZE bytes are sent with brotli or gzip, whichever the client
+accepts (brotli only if the Brotli package is installed). The encoding is
+part of the ETag, as each encoding is a different representation, and
+so is the variant (e.g. a content type picked from Accept) of endpoints
+that offer more than one.
+"""
+import functools
+import gzip
+import os
+
+from flask import make_response, request
+
+from .metrics import stage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate_encoding():
+    """The content coding to compress responses with, or None for identity."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def versioned(current_version, variant=None):
+    """Give the view's responses a strong ETag from current_version() and compress large ones.
+
+    current_version() returns the version of the data the view serves, or
+    None if it is unknown, in which case responses are sent uncached.
+    variant(), if given, names the representation the request asks for
+    (None for the default one); responses then vary on Accept.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            version = current_version()
+            encoding = negotiate_encoding()
+            name = variant() if variant is not None else None
+            if version is not None and name is not None:
+                version = f'{version}-{name}'
+            if version is not None:
+                # Small bodies are sent uncompressed, under the plain version
+                etags = [str(version)] + ([f'{version}-{encoding}'] if encoding else [])
+                for etag in etags:
+                    if request.if_none_match.contains(etag):
+                        response = make_response('', 304)
+                        response.set_etag(etag)
+                        response.vary.add('Accept-Encoding')
+                        if variant is not None:
+                            response.vary.add('Accept')
+                        return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+            response.vary.add('Accept-Encoding')
+            if variant is not None:
+                response.vary.add('Accept')
+            body = response.get_data()
+            if encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+                with stage('compress'):
+                    response.set_data(compress(body, encoding))
+                response.content_encoding = encoding
+                if version is not None:
+                    response.set_etag(f'{version}-{encoding}')
+            elif version is not None:
+                response.set_etag(str(version))
+            return response
+        return wrapper
+    return decorator
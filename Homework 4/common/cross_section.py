@@ -0,0 +1,71 @@
+"""Technical indicators for many companies in one vectorized pass.
+
+Prices are laid out as a bars x companies matrix aligned on each company's
+latest bar: the last row holds every company's most recent price, the row
+above it the bar before, and so on, with NaN above a company's first bar.
+Each indicator is then a single 2-D rolling/ewm operation over the matrix,
+and every column gets the values TechnicalAnalysis computes for that
+company on its own.
+"""
+import numpy as np
+import pandas as pd
+
+INDICATORS = ['sma20', 'ema20', 'rsi', 'macd', 'signal', 'histogram',
+              'bollinger_middle', 'bollinger_upper', 'bollinger_lower']
+
+
+def align_latest(codes, ranks, values, companies) -> pd.DataFrame:
+    """Build the price matrix from flat arrays.
+
+    codes[i] is the column (index into companies) of values[i] and ranks[i]
+    how many bars before that company's latest bar it is (0 for the latest).
+    """
+    codes, ranks = np.asarray(codes), np.asarray(ranks)
+    bars = int(ranks.max()) + 1 if len(ranks) else 0
+    matrix = np.full((bars, len(companies)), np.nan)
+    matrix[bars - 1 - ranks, codes] = values
+    return pd.DataFrame(matrix, columns=list(companies))
+
+
+def price_matrix(df: pd.DataFrame, limit: int = None) -> pd.DataFrame:
+    """Lay out a long Date/Company/Last_Price frame, keeping at most `limit` bars per company."""
+    df = df.sort_values(['Company', 'Date'], ascending=[True, False], kind='mergesort')
+    ranks = df.groupby('Company', sort=False).cumcount().to_numpy()
+    if limit is not None:
+        df, ranks = df[ranks < limit], ranks[ranks < limit]
+    codes, companies = pd.factorize(df['Company'])
+    return align_latest(codes, ranks, df['Last_Price'].to_numpy(dtype=float), companies)
+
+
+def analyze_matrix(prices: pd.DataFrame) -> pd.DataFrame:
+    """Latest SMA/EMA/RSI/MACD/Bollinger values of every column, one row per company."""
+    if prices.empty:
+        return pd.DataFrame(np.nan, index=prices.columns, columns=INDICATORS)
+
+    sma20 = prices.rolling(window=20).mean()
+    std20 = prices.rolling(window=20).std()
+    ema = {span: prices.ewm(span=span, adjust=False).mean() for span in (12, 20, 26)}
+    macd = ema[12] - ema[26]
+    signal = macd.ewm(span=9, adjust=False).mean()
+
+    # A company's first bar counts as a zero gain and loss, as in
+    # TechnicalAnalysis; the NaN padding above it must stay NaN
+    delta = prices.diff()
+    listed = prices.notna()
+    gains = delta.where(delta > 0, 0.0).where(listed)
+    losses = (-delta.where(delta < 0, 0.0)).where(listed)
+    rs = gains.rolling(window=14).mean() / losses.rolling(window=14).mean()
+    rsi = (100 - (100 / (1 + rs))).fillna(50)
+
+    latest = {
+        'sma20': sma20.iloc[-1],
+        'ema20': ema[20].iloc[-1],
+        'rsi': rsi.iloc[-1],
+        'macd': macd.iloc[-1],
+        'signal': signal.iloc[-1],
+        'histogram': (macd - signal).iloc[-1],
+        'bollinger_middle': sma20.iloc[-1],
+        'bollinger_upper': (sma20 + std20 * 2).iloc[-1],
+        'bollinger_lower': (sma20 - std20 * 2).iloc[-1],
+    }
+    return pd.DataFrame(latest, index=prices.columns, columns=INDICATORS)
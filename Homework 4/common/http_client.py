@@ -0,0 +1,149 @@
+"""Pooled HTTP client for calls between the services.
+
+Each ServiceClient keeps one requests.Session with a bounded keep-alive
+connection pool, so repeated calls reuse TCP connections. Every call has
+connect/read timeouts, idempotent GETs are retried a bounded number of
+times on connection errors and 502/503/504, and a circuit breaker stops
+calling a service that keeps failing so callers can fall back at once
+instead of waiting on timeouts.
+
+Calls made while handling a request carry its X-Request-ID (see
+metrics.py), so the called service logs and answers under the same ID.
+
+Responses that carry an ETag are kept (LRU-bounded) and revalidated with
+If-None-Match; on a 304 the kept response is returned, so unchanged data
+is neither re-sent nor decompressed again.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import request_id_headers
+
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 2))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+BREAKER_THRESHOLD = int(os.environ.get('HTTP_BREAKER_THRESHOLD', 5))
+BREAKER_RESET = float(os.environ.get('HTTP_BREAKER_RESET', 30))
+ETAG_CACHE_SIZE = int(os.environ.get('HTTP_ETAG_CACHE_SIZE', 256))
+# The service itself is unavailable: retried, and counted against the circuit breaker.
+# Other errors, like a 500 for one company's bad data, are answers and are not
+TRANSIENT_STATUSES = (502, 503, 504)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a service whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and lets one trial call through
+    every `reset_timeout` seconds until a call succeeds again."""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: let this call test the service, keep the rest failing fast
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class ETagCache:
+    """The last 200 response with an ETag of each URL, least recently used evicted first."""
+
+    def __init__(self, maxsize=ETAG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.responses = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            response = self.responses.get(url)
+            if response is not None:
+                self.responses.move_to_end(url)
+            return response
+
+    def put(self, url, response):
+        with self.lock:
+            self.responses[url] = response
+            self.responses.move_to_end(url)
+            while len(self.responses) > self.maxsize:
+                self.responses.popitem(last=False)
+
+    def revalidate(self, url, kwargs):
+        """Add If-None-Match for the kept response of url to the request kwargs; return that response."""
+        cached = self.get(url)
+        if cached is not None:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), 'If-None-Match': cached.headers['ETag']}
+        return cached
+
+    def resolve(self, url, response, cached):
+        """Return the response to hand to the caller, keeping it if it has an ETag."""
+        if response.status_code == 304 and cached is not None:
+            return cached
+        if response.status_code == 200 and 'ETag' in response.headers:
+            self.put(url, response)
+        return response
+
+
+class ServiceClient:
+    def __init__(self, base_url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=RETRIES,
+                 pool_size=POOL_SIZE, breaker=None, etags=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.etags = etags or ETagCache()
+
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=0.1, status_forcelist=TRANSIENT_STATUSES,
+                      allowed_methods=frozenset(['GET']), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, path, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs['headers'] = request_id_headers(kwargs.get('headers'))
+        url = requests.Request('GET', f'{self.base_url}{path}', params=kwargs.get('params')).prepare().url
+        cached = self.etags.revalidate(url, kwargs)
+        try:
+            response = self.session.get(f'{self.base_url}{path}', **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code in TRANSIENT_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return self.etags.resolve(url, response, cached)
@@ -0,0 +1,285 @@
+"""Request and stage latency histograms, served at /api/metrics.
+
+init_app() times every request of the app per route, and code on the hot
+path times its stages (fetch, decode, compute, serialize, render...) with
+
+    with stage('fetch'):
+        ...
+
+/api/metrics returns both histograms in the Prometheus text format.
+
+Every request has an ID: the X-Request-ID header it came with, or a new
+one. It is sent back in the response, and the HTTP clients pass it on to
+the services they call, so one page view can be followed through all
+three services. REQUEST_LOG=1 logs a line per request with its ID, route,
+status and stage times.
+
+With several worker processes, each one writes its histograms to a file
+in METRICS_DIR (at most a second behind), and /api/metrics adds up every
+worker's file, so a scrape covers the whole service rather than whichever
+worker answered it.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_DIR = os.environ.get('METRICS_DIR')
+DUMP_INTERVAL = 1.0
+REQUEST_LOG = os.environ.get('REQUEST_LOG', '0') == '1'
+REQUEST_ID_HEADER = 'X-Request-ID'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_VALID_ID = re.compile(r'[A-Za-z0-9._-]{1,64}')
+logger = logging.getLogger(__name__)
+if REQUEST_LOG:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+class Histogram:
+    """Observation counts per bucket, and their sum, for each combination of label values."""
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, values, seconds):
+        with self.lock:
+            series = self.series.get(values)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum
+                series = self.series[values] = [0] * (len(BUCKETS) + 1) + [0.0]
+            series[bisect.bisect_left(BUCKETS, seconds)] += 1
+            series[-1] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {values: list(series) for values, series in self.series.items()}
+
+
+REQUESTS = Histogram('http_request_duration_seconds', 'Time taken to answer a request.',
+                     ('route', 'method', 'status'))
+STAGES = Histogram('stage_duration_seconds', 'Time spent in one stage of a request.',
+                   ('route', 'stage'))
+HISTOGRAMS = (REQUESTS, STAGES)
+service_name = ''
+
+
+class Trace:
+    """The request being handled in the current thread or task."""
+
+    def __init__(self, request_id, route):
+        self.id = request_id
+        self.route = route
+        self.start = time.perf_counter()
+        self.stages = []
+
+
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+def current_request_id():
+    trace = _trace.get()
+    return trace.id if trace is not None else None
+
+
+def request_id_headers(headers=None):
+    """headers plus the current request's X-Request-ID, for calls to other services."""
+    request_id = current_request_id()
+    if request_id is None:
+        return headers
+    return {**(headers or {}), REQUEST_ID_HEADER: request_id}
+
+
+def begin_request(request_id, route):
+    if not request_id or not _VALID_ID.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+    _trace.set(Trace(request_id, route))
+    return request_id
+
+
+def end_request(method, status):
+    trace = _trace.get()
+    if trace is None:
+        return
+    _trace.set(None)
+    elapsed = time.perf_counter() - trace.start
+    REQUESTS.observe((trace.route, method, str(status)), elapsed)
+    if REQUEST_LOG:
+        stages = ' '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in trace.stages)
+        logger.info('%s %s %s %s %d %.1fms %s', service_name, trace.id, method, trace.route,
+                    status, elapsed * 1000, stages)
+    _changed()
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as a stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        trace = _trace.get()
+        # Work done outside a request, e.g. a background page refresh
+        route = trace.route if trace is not None else 'background'
+        STAGES.observe((route, name), elapsed)
+        if trace is not None:
+            trace.stages.append((name, elapsed))
+
+
+# Sharing between worker processes: every process dumps its own histograms
+# from a background thread, started on its first request
+_dump_lock = threading.Lock()
+_dirty = threading.Event()
+_dumper_pid = None
+
+
+def _changed():
+    global _dumper_pid
+    if METRICS_DIR is None:
+        return
+    _dirty.set()
+    if _dumper_pid != os.getpid():
+        with _dump_lock:
+            if _dumper_pid != os.getpid():
+                _dumper_pid = os.getpid()
+                threading.Thread(target=_dump_periodically, daemon=True).start()
+
+
+def _dump_periodically():
+    while True:
+        _dirty.wait()
+        time.sleep(DUMP_INTERVAL)
+        _dirty.clear()
+        try:
+            dump()
+        except OSError:
+            logger.exception("Could not write metrics to %s", METRICS_DIR)
+
+
+def dump():
+    """Write this process's histograms to METRICS_DIR/<pid>.json."""
+    data = {histogram.name: [[list(values), series] for values, series in histogram.snapshot().items()]
+            for histogram in HISTOGRAMS}
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+    with _dump_lock:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+
+def collect():
+    """{histogram name: {label values: series}} of this process, or of every worker with METRICS_DIR."""
+    if METRICS_DIR is None:
+        return {histogram.name: histogram.snapshot() for histogram in HISTOGRAMS}
+
+    dump()
+    merged = {histogram.name: {} for histogram in HISTOGRAMS}
+    for entry in os.listdir(METRICS_DIR):
+        if not entry.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, entry), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, rows in data.items():
+            totals = merged.get(name)
+            if totals is None:
+                continue
+            for values, series in rows:
+                values = tuple(values)
+                if values in totals:
+                    totals[values] = [a + b for a, b in zip(totals[values], series)]
+                else:
+                    totals[values] = series
+    return merged
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render():
+    """The histograms in the Prometheus text exposition format."""
+    collected = collect()
+    lines = []
+    for histogram in HISTOGRAMS:
+        name, names = histogram.name, ('service',) + histogram.labels
+        lines.append(f'# HELP {name} {histogram.help}')
+        lines.append(f'# TYPE {name} histogram')
+        for values, series in sorted(collected[histogram.name].items()):
+            values = (service_name,) + values
+            count = 0
+            for bound, observed in zip(BUCKETS + ('+Inf',), series[:-1]):
+                count += observed
+                lines.append(f'{name}_bucket{_labels(names, values, le=bound)} {count}')
+            lines.append(f'{name}_sum{_labels(names, values)} {series[-1]!r}')
+            lines.append(f'{name}_count{_labels(names, values)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def route_of(request):
+    # The URL rule rather than the path, so every company shares one series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def init_app(app, service):
+    """Time every request of a Flask or Quart app, and add its /api/metrics route.
+
+    Call it right after creating the app, so the timing covers the app's
+    own before_request hooks too.
+    """
+    global service_name
+    service_name = service
+
+    if type(app).__module__.split('.')[0] == 'quart':
+        from quart import Response, request
+
+        @app.before_request
+        async def start_trace():
+            begin_request(request.headers.get(REQUEST_ID_HEADER), route_of(request))
+
+        @app.after_request
+        async def finish_trace(response):
+            response.headers[REQUEST_ID_HEADER] = current_request_id() or ''
+            end_request(request.method, response.status_code)
+            return response
+
+        async def metrics():
+            return Response(render(), content_type=CONTENT_TYPE)
+    else:
+        from flask import Response, request
+
+        @app.before_request
+        def start_trace():
+            begin_request(request.headers.get(REQUEST_ID_HEADER), route_of(request))
+
+        @app.after_request
+        def finish_trace(response):
+            response.headers[REQUEST_ID_HEADER] = current_request_id() or ''
+            end_request(request.method, response.status_code)
+            return response
+
+        def metrics():
+            return Response(render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/api/metrics', 'metrics', metrics)
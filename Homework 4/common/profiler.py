@@ -0,0 +1,271 @@
+"""Opt-in sampling profiler for slow or randomly chosen requests.
+
+PROFILE_SAMPLE_RATE=0.01 profiles 1% of the requests, PROFILE_SLOW_MS=1000
+every request that takes a second or more; both are off by default. While
+a request runs, a background thread records its call stack every
+PROFILE_INTERVAL_MS (20) milliseconds. When the request ends, the counted
+stacks are written to PROFILE_DIR in the folded format that flamegraph.pl,
+speedscope and similar tools read, one line per distinct stack:
+
+    run (app.py:120);dispatch_request (app.py:1502);analysis (app.py:119);... 12
+
+Only chosen requests are sampled from the start. Whether a request is slow
+is only known when it ends, so the others are sampled once they have run
+for PROFILE_SLOW_START (0.5) of PROFILE_SLOW_MS, and dropped if they end
+up faster than that; a slow request's profile therefore covers its later
+part. Requests below that are never walked, and cost two dict updates.
+
+In a Flask app a request has a thread to itself, whose stack is sampled.
+In a Quart app (the web service's asgi.py) requests are tasks sharing the
+event loop's thread: while the request's task is running, the thread's
+stack is sampled, and while it waits, the chain of coroutines the task is
+suspended in (task.get_stack() only has the outermost one) with a
+'(waiting)' frame on top. Time spent in tasks the request starts,
+such as the ones asyncio.gather() wraps its calls in, shows up as waiting
+where the request awaits them.
+
+Only the newest PROFILE_KEEP profiles are kept. GET /api/admin/profiles
+lists them and /api/admin/profiles/<name> returns one, to requests with an
+X-Admin-Token header matching PROFILE_ADMIN_TOKEN.
+"""
+import asyncio
+import collections
+import hmac
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+SLOW_START = float(os.environ.get('PROFILE_SLOW_START', 0.5))
+INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', 20)) / 1000
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'profiles'))
+KEEP = int(os.environ.get('PROFILE_KEEP', 100))
+ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN')
+SUFFIX = '.folded'
+WAITING = '(waiting)'
+
+_PROFILE_NAME = re.compile(r'[A-Za-z0-9._-]+\.folded')
+
+
+class Profile:
+    """The stacks sampled from one request, with how often each was seen.
+
+    `task` is the request's asyncio task in a Quart app, None in a Flask app.
+    """
+
+    def __init__(self, thread_id, path, chosen, task=None, loop=None):
+        self.thread_id = thread_id
+        self.path = path
+        self.chosen = chosen
+        self.task = task
+        self.loop = loop
+        self.start = time.perf_counter()
+        self.stacks = collections.Counter()
+
+    @property
+    def key(self):
+        return self.thread_id if self.task is None else self.task
+
+
+class Sampler:
+    """Samples the stacks of the requests in flight from a background thread."""
+
+    def __init__(self, interval=INTERVAL, slow_ms=SLOW_MS, slow_start=SLOW_START):
+        self.interval = interval
+        # Unchosen requests are only walked once they may turn out slow
+        self.watch_after = slow_ms * slow_start / 1000 if slow_ms > 0 else float('inf')
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.labels = {}
+        self.pid = None
+
+    def start(self, profile):
+        with self.lock:
+            self.active[profile.key] = profile
+            # Threads do not survive a fork, e.g. into gunicorn workers
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self.run, daemon=True).start()
+        self.wakeup.set()
+
+    def stop(self, profile):
+        """Stop sampling the profile; no sample is added to it once this returns."""
+        with self.lock:
+            self.active.pop(profile.key, None)
+
+    def run(self):
+        while True:
+            self.wakeup.clear()
+            if not self.active:
+                self.wakeup.wait()
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        now = time.perf_counter()
+        with self.lock:
+            due = [profile for profile in self.active.values()
+                   if profile.chosen or now - profile.start >= self.watch_after]
+            if not due:
+                return
+            frames = sys._current_frames()
+            for profile in due:
+                stack = self.stack_of(profile, frames)
+                if stack:
+                    profile.stacks[stack] += 1
+
+    def stack_of(self, profile, frames):
+        if profile.task is not None and asyncio.current_task(profile.loop) is not profile.task:
+            labels = [self.label(frame.f_code) for frame in awaited_frames(profile.task.get_coro())]
+            return ';'.join(labels + [WAITING]) if labels else None
+        frame = frames.get(profile.thread_id)
+        return self.fold(frame) if frame is not None else None
+
+    def fold(self, frame):
+        """The stack as 'outermost;...;innermost' function labels."""
+        labels = []
+        while frame is not None:
+            labels.append(self.label(frame.f_code))
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            label = self.labels[code] = label.replace(';', ',')
+        return label
+
+
+sampler = Sampler()
+
+
+def awaited_frames(coro):
+    """The frames of a suspended coroutine and of the ones it awaits, outermost first."""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return frames
+
+
+def save(profile, elapsed_ms, directory=PROFILE_DIR, keep=KEEP):
+    """Write the profile as a folded-stacks file and drop the oldest beyond `keep`; returns its name."""
+    os.makedirs(directory, exist_ok=True)
+    path = re.sub(r'[^A-Za-z0-9]+', '_', profile.path).strip('_') or 'root'
+    name = (f'{datetime.now():%Y%m%dT%H%M%S}-{path[:60]}-{elapsed_ms:.0f}ms-'
+            f'{uuid.uuid4().hex[:8]}{SUFFIX}')
+    lines = [f'{stack} {count}\n' for stack, count in profile.stacks.most_common()]
+    target = os.path.join(directory, name)
+    with open(target + '.tmp', 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    os.replace(target + '.tmp', target)
+
+    profiles = sorted((entry for entry in os.scandir(directory) if entry.name.endswith(SUFFIX)),
+                      key=lambda entry: entry.stat().st_mtime)
+    for entry in profiles[:max(len(profiles) - keep, 0)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return name
+
+
+def finish(profile, logger):
+    """Stop sampling a request and save its profile if it was chosen or slow."""
+    sampler.stop(profile)
+    elapsed_ms = (time.perf_counter() - profile.start) * 1000
+    if profile.stacks and (profile.chosen or (SLOW_MS > 0 and elapsed_ms >= SLOW_MS)):
+        try:
+            save(profile, elapsed_ms)
+        except OSError:
+            logger.exception("Could not save a profile to %s", PROFILE_DIR)
+
+
+def authorized(headers):
+    token = headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def profile_list():
+    """The saved profiles, newest first."""
+    entries = []
+    if os.path.isdir(PROFILE_DIR):
+        entries = [(entry.name, entry.stat()) for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(SUFFIX)]
+    entries.sort(key=lambda entry: entry[1].st_mtime, reverse=True)
+    return [{'name': name, 'size': stat.st_size,
+             'created': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds')}
+            for name, stat in entries]
+
+
+def init_app(app):
+    """Add the admin endpoints to a Flask or Quart app, and profile its requests if the environment asks for it."""
+    enabled = SAMPLE_RATE > 0 or SLOW_MS > 0
+
+    if type(app).__module__.split('.')[0] == 'quart':
+        from quart import abort, g, jsonify, request, send_from_directory
+
+        async def list_profiles():
+            if not authorized(request.headers):
+                abort(403)
+            return jsonify({'profiles': profile_list()})
+
+        async def get_profile(name):
+            if not authorized(request.headers):
+                abort(403)
+            if not _PROFILE_NAME.fullmatch(name):
+                abort(404)
+            return await send_from_directory(PROFILE_DIR, name, mimetype='text/plain')
+
+        if enabled:
+            @app.before_request
+            async def start_profile():
+                g.profile = Profile(threading.get_ident(), request.path, random.random() < SAMPLE_RATE,
+                                    asyncio.current_task(), asyncio.get_running_loop())
+                sampler.start(g.profile)
+
+            @app.teardown_request
+            async def finish_profile(exc):
+                profile = g.pop('profile', None)
+                if profile is not None:
+                    finish(profile, app.logger)
+    else:
+        from flask import abort, g, jsonify, request, send_from_directory
+
+        def list_profiles():
+            if not authorized(request.headers):
+                abort(403)
+            return jsonify({'profiles': profile_list()})
+
+        def get_profile(name):
+            if not authorized(request.headers):
+                abort(403)
+            if not _PROFILE_NAME.fullmatch(name):
+                abort(404)
+            return send_from_directory(PROFILE_DIR, name, mimetype='text/plain')
+
+        if enabled:
+            @app.before_request
+            def start_profile():
+                g.profile = Profile(threading.get_ident(), request.path, random.random() < SAMPLE_RATE)
+                sampler.start(g.profile)
+
+            @app.teardown_request
+            def finish_profile(exc):
+                profile = g.pop('profile', None)
+                if profile is not None:
+                    finish(profile, app.logger)
+
+    app.add_url_rule('/api/admin/profiles', 'list_profiles', list_profiles)
+    app.add_url_rule('/api/admin/profiles/<name>', 'get_profile', get_profile)
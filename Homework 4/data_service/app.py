@@ -1,70 +1,257 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
+import numpy as np
 import pandas as pd
 from flask_cors import CORS
+import logging
 import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+# The modules the services share live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import metrics, profiler, wire
+from common.conditional import versioned
+from common.metrics import stage
+from dataset import (HISTORY_FIELDS, IndexedDataset, encode_columns, encode_history, pack_columns,
+                     to_records)
+from snapshot import SnapshotStore
+from storage import find_store
 
 app = Flask(__name__)
+metrics.init_app(app, 'data_service')
+profiler.init_app(app)
 CORS(app)
+logger = logging.getLogger(__name__)
 
 class DataService:
-    def __init__(self):
-        self.df = None
+    def __init__(self, check_interval=5.0, snapshot_dir=None):
+        self.store = None
+        self.signature = None
+        self.check_interval = check_interval
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+        # With several worker processes, the dataset is shared through a snapshot
+        self.snapshots = SnapshotStore(snapshot_dir) if snapshot_dir else None
+        self.data = IndexedDataset.from_frame(pd.DataFrame())
         self.load_data()
 
     def load_data(self):
         try:
             possible_locations = [
-                '/app/data/mse_data.csv',
-                './data/mse_data.csv',
-                '../data/mse_data.csv',
-                '../../data/mse_data.csv'
+                '/app/data/mse_store',
+                './data/mse_store',
+                '../data/mse_store',
+                '../../data/mse_store'
             ]
 
-            for location in possible_locations:
-                if os.path.exists(location):
-                    self.df = pd.read_csv(location)
-                    self.df['Date'] = pd.to_datetime(self.df['Date'])
-                    self.df = self.df.sort_values('Date', ascending=False)
-                    return
-        except Exception as e:
-            self.df = pd.DataFrame()
+            store = find_store(possible_locations)
+            if store is not None:
+                signature = self.manifest_signature(store)
+                if self.snapshots is not None:
+                    data = self.snapshots.load(self.snapshots.ensure(store))
+                else:
+                    data = IndexedDataset.from_frame(store.read_all(), store.version())
+                # Swapping one object keeps requests from mixing old and new data
+                self.data = data
+                self.store, self.signature = store, signature
+        except Exception:
+            # Keep serving the data already loaded; the signature is unchanged, so the next refresh retries
+            logger.exception("Could not load the data store")
+
+    @staticmethod
+    def manifest_signature(store):
+        try:
+            stat = os.stat(store.manifest_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """Reload the data if the scraper has published a new version since the last check."""
+        if time.monotonic() - self.last_check < self.check_interval:
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if self.store is None or self.manifest_signature(self.store) != self.signature:
+                with stage('load'):
+                    self.load_data()
+            self.last_check = time.monotonic()
+        finally:
+            self.lock.release()
+
+data_service = DataService(snapshot_dir=os.environ.get('DATA_SNAPSHOT_DIR'))
+
+
+def wants_columns():
+    """Whether the client asked for the packed columnar format (see common/wire.py) over JSON."""
+    return request.accept_mimetypes.best_match(['application/json', wire.MEDIA_TYPE]) == wire.MEDIA_TYPE
 
-data_service = DataService()
+# Responses only change with the data, so they are tagged with its version
+data_versioned = versioned(lambda: data_service.data.version)
+history_versioned = versioned(lambda: data_service.data.version,
+                              variant=lambda: 'columns' if wants_columns() else None)
+
+@app.before_request
+def refresh_data():
+    data_service.refresh()
+
+@app.after_request
+def add_data_version(response):
+    # Lets clients key their caches on the data they were served
+    response.headers['X-Data-Version'] = str(data_service.data.version)
+    return response
+
+@app.route('/api/version')
+def get_version():
+    return jsonify({'version': data_service.data.version})
 
 @app.route('/api/health')
 def health_check():
-    if data_service.df is None or data_service.df.empty:
+    if data_service.data.empty:
         return jsonify({'status': 'unhealthy', 'message': 'No data loaded'}), 500
-    return jsonify({'status': 'healthy', 'rows': len(data_service.df)})
+    return jsonify({'status': 'healthy', 'rows': len(data_service.data)})
 
 @app.route('/api/companies')
+@data_versioned
 def get_companies():
-    if data_service.df is None or data_service.df.empty:
+    if data_service.data.empty:
         return jsonify({'error': 'No data available'}), 404
-    companies = data_service.df['Company'].unique().tolist()
-    return jsonify({'companies': companies})
+    return jsonify({'companies': data_service.data.companies})
+
+def parse_history_query(args):
+    """Validate the optional from/to/cursor/limit/fields parameters of the history endpoints."""
+    query = {}
+    for param, key in (('from', 'start'), ('to', 'end'), ('cursor', 'before')):
+        value = args.get(param)
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"'{param}' must be a date in YYYY-MM-DD format")
+            query[key] = value
+
+    if args.get('limit'):
+        limit = args.get('limit', type=int)
+        if limit is None or limit < 1:
+            raise ValueError("'limit' must be a positive integer")
+        query['limit'] = limit
+
+    fields = HISTORY_FIELDS
+    if args.get('fields'):
+        requested = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in requested if field not in HISTORY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        fields = ['Date'] + [field for field in requested if field != 'Date']
+    return query, fields
 
 @app.route('/api/company/<company>')
+@history_versioned
 def get_company_data(company):
-    if data_service.df is None or data_service.df.empty:
+    data = data_service.data
+    if data.empty:
         return jsonify({'error': 'No data available'}), 404
 
-    company_df = data_service.df[data_service.df['Company'] == company].copy()
-    if company_df.empty:
+    if wants_columns():
+        try:
+            query, fields = parse_history_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with stage('lookup'):
+            rows, next_cursor = data.query(company, **query)
+        if rows is None:
+            return jsonify({'error': f'No data found for company {company}'}), 404
+        with stage('serialize'):
+            body = pack_columns(rows, fields, next_cursor=next_cursor)
+        return Response(body, mimetype=wire.MEDIA_TYPE)
+
+    if not request.args:
+        # Encoded once per data version and company
+        with stage('serialize'):
+            body = data.history_json(company)
+    else:
+        try:
+            query, fields = parse_history_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with stage('lookup'):
+            rows, next_cursor = data.query(company, **query)
+        with stage('serialize'):
+            body = None if rows is None else encode_history(rows, fields, next_cursor)
+
+    if body is None:
         return jsonify({'error': f'No data found for company {company}'}), 404
 
-    result = []
-    for _, row in company_df.iterrows():
-        result.append({
-            'Date': row['Date'].strftime('%Y-%m-%d'),
-            'Last_Price': float(row['Last_Price']),
-            'Change_Pct': float(row['Change_Pct']),
-            'Volume': float(row['Volume']),
-            'High': float(row['High']),
-            'Low': float(row['Low'])
-        })
+    return Response(body, mimetype='application/json')
+
+def company_names(names):
+    """The names in a comma-separated list, each once, in the order given."""
+    return list(dict.fromkeys(name.strip() for name in names.split(',') if name.strip()))
+
+def requested_companies(data):
+    """Companies named in ?companies=A,B,C, or the first ?limit= companies of the listing."""
+    names = request.args.get('companies')
+    if names:
+        return company_names(names)
+    limit = request.args.get('limit', type=int)
+    return data.companies[:limit] if limit else data.companies
+
+@app.route('/api/latest')
+@data_versioned
+def get_latest():
+    data = data_service.data
+    if data.empty:
+        return jsonify({'error': 'No data available'}), 404
+
+    with stage('lookup'):
+        latest = data.latest(requested_companies(data))
+    with stage('serialize'):
+        return jsonify({'latest': to_records(latest, ['Company'] + HISTORY_FIELDS)})
 
-    return jsonify({'history': result})
+@app.route('/api/market/history')
+@history_versioned
+def get_market_history():
+    """History of many companies in one columnar response; ?limit= caps the rows per company."""
+    data = data_service.data
+    if data.empty:
+        return jsonify({'error': 'No data available'}), 404
+
+    try:
+        query, fields = parse_history_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    names = request.args.get('companies')
+    companies = company_names(names) if names else data.companies
+    with stage('lookup'):
+        rows, companies, lengths = data.market_history(companies, **query)
+    with stage('serialize'):
+        if wants_columns():
+            return Response(pack_columns(rows, fields, companies=companies, lengths=lengths),
+                            mimetype=wire.MEDIA_TYPE)
+        return Response(encode_columns(rows, fields, companies, lengths), mimetype='application/json')
+
+@app.route('/api/market/summary')
+@data_versioned
+def get_market_summary():
+    """The newest row of the requested companies (as /api/latest), the number of companies, and
+    latest_volume: the Volume of those rows summed, missing counted as 0, i.e. the total of the
+    tiles a page built from `latest` shows."""
+    data = data_service.data
+    if data.empty:
+        return jsonify({'error': 'No data available'}), 404
+
+    with stage('lookup'):
+        latest = data.latest(requested_companies(data))
+    with stage('serialize'):
+        return jsonify({
+            'companies': len(data.companies),
+            'latest_volume': float(np.nansum(latest.numbers('Volume'))),
+            'latest': to_records(latest, ['Company'] + HISTORY_FIELDS)
+        })
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5002))
@@ -0,0 +1,279 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from common import wire
+
+HISTORY_FIELDS = ['Date', 'Last_Price', 'Change_Pct', 'Volume', 'High', 'Low']
+PRICE_FIELDS = ['Last_Price', 'High', 'Low', 'Average', 'Change_Pct']
+COUNT_FIELDS = ['Volume', 'Turnover', 'Total_Turnover']
+
+
+class IndexedDataset:
+    """The dataset sorted into one contiguous, newest-first block per company.
+
+    `index` maps each company to the slice of its block, so looking up an
+    issuer is a dict access plus a positional slice instead of a scan.
+    Everything derived from the data (like encoded responses) is cached on
+    the instance, so swapping in a new IndexedDataset invalidates it all.
+
+    Rows are held as plain column arrays rather than a DataFrame, so they
+    can equally live in this process or be read-only memory maps of a
+    snapshot shared by every worker (see snapshot.py):
+
+        Date       int32 day numbers since the Unix epoch
+        Company    int32 codes into `names`
+        prices     float32, NaN when missing
+        counts     int64, with a boolean array in `masks` marking missing values
+    """
+
+    def __init__(self, columns, masks, names, version=0, starts=None):
+        self.version = version
+        self.json_cache = {}
+        self.columns, self.masks = columns, masks
+        self.names = np.asarray(names, dtype=object)
+
+        codes, days = columns['Company'], columns['Date']
+        if starts is None:
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else []
+        self.starts = np.asarray(starts, dtype=np.int64)
+        stops = np.r_[self.starts[1:], len(codes)]
+        self.index = {self.names[codes[start]]: slice(int(start), int(stop))
+                      for start, stop in zip(self.starts, stops)}
+
+        # Most recently traded companies first, as the date-sorted frame used to list them
+        order = np.argsort(-days[self.starts].astype(np.int64), kind='stable')
+        self.companies = [self.names[codes[self.starts[i]]] for i in order]
+
+    @classmethod
+    def from_frame(cls, df, version=0):
+        """Build the column arrays from a frame in the store's layout."""
+        if df.empty:
+            df = pd.DataFrame({'Date': pd.Series(dtype='int32'), 'Company': pd.Series(dtype='object')})
+
+        df = df.assign(Company=df['Company'].astype('category'), Date=day_numbers(df['Date']))
+        df = df.sort_values(['Company', 'Date'], ascending=[True, False], kind='mergesort')
+        columns = {
+            'Date': df['Date'].to_numpy(dtype=np.int32),
+            'Company': df['Company'].cat.codes.to_numpy().astype(np.int32),
+        }
+        masks = {}
+        for field in PRICE_FIELDS:
+            values = pd.to_numeric(df[field]) if field in df else pd.Series(np.nan, index=df.index)
+            columns[field] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+        for field in COUNT_FIELDS:
+            values = pd.to_numeric(df[field]) if field in df else pd.Series(np.nan, index=df.index)
+            values = values.round().astype('Int64')
+            masks[field] = values.isna().to_numpy()
+            columns[field] = values.to_numpy(dtype=np.int64, na_value=0)
+        return cls(columns, masks, df['Company'].cat.categories.astype(str), version)
+
+    def __len__(self):
+        return len(self.columns['Date'])
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def company(self, company):
+        """Return the company's rows (newest first) without scanning the data, or None."""
+        rows = self.index.get(company)
+        if rows is None:
+            return None
+        return Rows(self, rows)
+
+    def latest(self, companies):
+        """Return the newest row of each known company, in the given order."""
+        positions = [self.index[company].start for company in companies if company in self.index]
+        return Rows(self, np.array(positions, dtype=np.int64))
+
+    def query(self, company, start=None, end=None, before=None, limit=None):
+        """Select a company's rows between two dates (inclusive), newest first.
+
+        `before` skips every row dated on or after it, which is how a cursor
+        resumes a previous page. Returns (rows, next_cursor) or (None, None)
+        for an unknown company; next_cursor is None on the last page.
+        """
+        rows = self.index.get(company)
+        if rows is None:
+            return None, None
+
+        lo, hi = self._bounds(rows, start, end, before)
+        next_cursor = None
+        if limit is not None and hi - lo > limit:
+            hi = lo + limit
+            next_cursor = str(date_strings(self.columns['Date'][rows.start + hi - 1:rows.start + hi])[0])
+        return Rows(self, slice(rows.start + lo, rows.start + hi)), next_cursor
+
+    def market_history(self, companies, start=None, end=None, before=None, limit=None):
+        """Select the rows of many companies at once, each company's block newest first.
+
+        Takes the same bounds as query(), with `limit` applied per company.
+        Returns (rows, companies, lengths) for the companies that are known.
+        """
+        found, lengths, positions = [], [], []
+        for company in companies:
+            rows = self.index.get(company)
+            if rows is None:
+                continue
+            lo, hi = self._bounds(rows, start, end, before)
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            found.append(company)
+            lengths.append(hi - lo)
+            positions.append(np.arange(rows.start + lo, rows.start + hi))
+
+        positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+        return Rows(self, positions), found, lengths
+
+    def _bounds(self, rows, start, end, before):
+        """Return the block-relative [lo, hi) range of rows inside the date bounds."""
+        # Negated day numbers ascend inside every newest-first block, so date
+        # bounds can be found with a binary search over the block
+        keys = -self.columns['Date'][rows].astype(np.int64)
+        lo, hi = 0, len(keys)
+        if end is not None:
+            lo = max(lo, np.searchsorted(keys, -_day_number(end), side='left'))
+        if before is not None:
+            lo = max(lo, np.searchsorted(keys, -_day_number(before), side='right'))
+        if start is not None:
+            hi = min(hi, np.searchsorted(keys, -_day_number(start), side='right'))
+        return int(lo), int(max(lo, hi))
+
+    def history_json(self, company):
+        """Return the encoded /api/company response body for a company, or None."""
+        body = self.json_cache.get(company)
+        if body is None:
+            rows = self.company(company)
+            if rows is None:
+                return None
+            body = encode_history(rows)
+            self.json_cache[company] = body
+        return body
+
+
+class Rows:
+    """A selection of dataset rows (a slice or an array of positions), read column by column."""
+
+    def __init__(self, data, selection):
+        self.data = data
+        self.selection = selection
+
+    def __len__(self):
+        if isinstance(self.selection, slice):
+            return self.selection.stop - self.selection.start
+        return len(self.selection)
+
+    def values(self, field):
+        return self.data.columns[field][self.selection]
+
+    def missing(self, field):
+        if field in self.data.masks:
+            return self.data.masks[field][self.selection]
+        return ~np.isfinite(self.values(field))
+
+    def numbers(self, field):
+        """The column as float64, with missing values as NaN."""
+        values = self.values(field).astype(np.float64)
+        values[self.missing(field)] = np.nan
+        return values
+
+    def companies(self):
+        return self.data.names[self.values('Company')]
+
+
+def day_numbers(dates):
+    """Convert a date column to int32 days since 1970-01-01."""
+    if pd.api.types.is_integer_dtype(dates.dtype):
+        return dates.astype(np.int32)
+    return pd.Series(pd.to_datetime(dates).to_numpy().astype('datetime64[D]').astype(np.int32),
+                     index=dates.index)
+
+
+def date_strings(days):
+    """Format int32 day numbers as YYYY-MM-DD."""
+    return np.datetime_as_string(np.asarray(days).astype('datetime64[D]'), unit='D')
+
+
+def _day_number(date):
+    return np.datetime64(date, 'D').astype(np.int64)
+
+
+def to_records(rows, fields):
+    """Convert rows to JSON-ready dicts column by column, with missing numbers as None."""
+    columns = []
+    for field in fields:
+        if field == 'Date':
+            columns.append(date_strings(rows.values('Date')).tolist())
+        elif field == 'Company':
+            columns.append(rows.companies().tolist())
+        else:
+            # Parsing the tokens gives the values exactly as /api/company encodes them
+            columns.append(json.loads('[' + ','.join(_number_tokens(rows, field)) + ']'))
+    return [dict(zip(fields, row)) for row in zip(*columns)]
+
+
+def _number_tokens(rows, field):
+    """Encode a numeric column as JSON number tokens, with missing values as null.
+
+    numpy formats floats with the shortest repr that round-trips in their
+    own precision, so float32 prices come out as written ("1234.56"), and
+    float64 ones as json.dumps would write them. Counts are held as int64
+    but were always served as floats ("19.0"), so they are written as
+    float64 too (exact below 2**53, far above any volume or turnover).
+    """
+    values = rows.values(field)
+    if values.dtype != np.float32:
+        values = values.astype(np.float64)
+    tokens = values.astype(str).astype(object)
+    tokens[rows.missing(field)] = 'null'
+    return tokens
+
+
+def _date_tokens(rows):
+    return '"' + date_strings(rows.values('Date')).astype(object) + '"'
+
+
+def encode_history(rows, fields=HISTORY_FIELDS, next_cursor=None):
+    """Encode rows as {"history": [...]} straight from the column arrays.
+
+    The output is laid out like jsonify() of the list of row dicts (sorted
+    keys, compact separators, trailing newline), with missing values as
+    null and numbers as written by _number_tokens(). A next_cursor, when
+    given, is added after the history list.
+    """
+    tail = ']}\n' if next_cursor is None else '],"next_cursor":"' + next_cursor + '"}\n'
+    if len(rows) == 0:
+        return ('{"history":[' + tail).encode('ascii')
+
+    columns = {field: _date_tokens(rows) if field == 'Date' else _number_tokens(rows, field)
+               for field in fields}
+    body = None
+    for i, field in enumerate(sorted(fields)):
+        prefix = ('{"' if i == 0 else ',"') + field + '":'
+        body = prefix + columns[field] if body is None else body + prefix + columns[field]
+    body = body + '}'
+    return ('{"history":[' + ','.join(body) + tail).encode('ascii')
+
+
+def encode_columns(rows, fields, companies, lengths):
+    """Encode the rows of several companies column by column.
+
+    The body is {"companies": [...], "lengths": [...], "history": {field:
+    [...]}}; the first lengths[0] values of every column belong to
+    companies[0], the next lengths[1] to companies[1], and so on.
+    """
+    columns = []
+    for field in sorted(fields):
+        tokens = _date_tokens(rows) if field == 'Date' else _number_tokens(rows, field)
+        columns.append('"' + field + '":[' + ','.join(tokens) + ']')
+    head = json.dumps({'companies': companies, 'lengths': lengths}, separators=(',', ':'))
+    return (head[:-1] + ',"history":{' + ','.join(columns) + '}}\n').encode('ascii')
+
+
+def pack_columns(rows, fields, **meta):
+    """Pack rows in the common/wire.py format: the column arrays as held, with masks for counts."""
+    columns = {field: rows.values(field) for field in fields}
+    masks = {field: rows.missing(field) for field in fields if field in rows.data.masks}
+    return wire.pack(columns, masks, meta)
@@ -0,0 +1,18 @@
+import os
+import shutil
+import tempfile
+
+# The dataset is mapped from a shared snapshot (see snapshot.py), so extra
+# workers cost little memory and start without reading the store
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+# Workers add up each other's request metrics through files here (see common/metrics.py)
+metrics_dir = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'data_service_metrics'))
+
+
+def on_starting(server):
+    # Counts from an earlier run must not be added to this one's
+    shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,131 @@
+"""Read-only snapshots of the dataset that every worker process maps.
+
+When the service runs as several worker processes, each one loading the
+store on its own would mean N copies of the dataset and N slow startups.
+Instead the first worker to see a new store version writes the dataset
+once, already sorted and indexed, as one .npy file per column:
+
+    snapshots/
+        CURRENT              name of the published snapshot
+        v42-3f9c0a1b2d4e/
+            meta.json        version, company names, block starts
+            Date.npy
+            Company.npy
+            Last_Price.npy ...
+            Volume.npy, Volume.missing.npy ...
+
+and every worker maps those files read-only (np.load(mmap_mode='r')).
+The pages live in the OS page cache once, whatever the number of workers,
+and building an IndexedDataset from a snapshot only reads meta.json.
+
+A snapshot is named after the store version and a digest of the store's
+location and manifest (its 'updated' time, mtime and size): a store that
+is re-created or re-imported counts its versions from 1 again, and must
+not be served an old snapshot once its counter catches up.
+
+Snapshots are written to a temporary directory and renamed into place,
+then CURRENT is replaced atomically, so a reader never sees a partial
+snapshot. Workers that still map an older snapshot keep their pages
+until they remap; the previous snapshot is kept around for them.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from dataset import COUNT_FIELDS, PRICE_FIELDS, IndexedDataset
+
+CURRENT = 'CURRENT'
+KEEP = 2
+
+
+def snapshot_name(store):
+    """Return (version, snapshot name) for the store's current state."""
+    manifest = store.manifest()
+    stat = os.stat(store.manifest_path())
+    identity = [os.path.realpath(store.root), manifest['version'], manifest.get('updated'),
+                stat.st_mtime_ns, stat.st_size]
+    digest = hashlib.sha1(json.dumps(identity).encode('utf-8')).hexdigest()[:12]
+    return manifest['version'], f"v{manifest['version']}-{digest}"
+
+
+class SnapshotStore:
+    def __init__(self, root):
+        self.root = root
+
+    def current(self):
+        """Return the name of the published snapshot, or None."""
+        try:
+            with open(os.path.join(self.root, CURRENT), encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self, name):
+        """Map a published snapshot as an IndexedDataset."""
+        path = os.path.join(self.root, name)
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+
+        def column(filename):
+            # Zero-length arrays can't be memory mapped
+            mmap_mode = 'r' if meta['rows'] else None
+            return np.load(os.path.join(path, filename + '.npy'), mmap_mode=mmap_mode)
+
+        columns = {field: column(field) for field in ['Date', 'Company'] + PRICE_FIELDS + COUNT_FIELDS}
+        masks = {field: column(field + '.missing') for field in COUNT_FIELDS}
+        return IndexedDataset(columns, masks, meta['names'], meta['version'], meta['starts'])
+
+    def ensure(self, store):
+        """Return the name of a snapshot of the store's current state, writing it if needed.
+
+        Only one process writes a given snapshot; the others wait on the
+        lock and then find it already published.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            version, name = snapshot_name(store)
+            if self.current() != name or not os.path.isdir(os.path.join(self.root, name)):
+                self._write(name, IndexedDataset.from_frame(store.read_all(), version))
+                self._publish(name)
+                self._prune(name)
+            return name
+
+    def _write(self, name, data):
+        path = os.path.join(self.root, name)
+        tmp = path + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for field, values in data.columns.items():
+            np.save(os.path.join(tmp, field + '.npy'), values)
+        for field, values in data.masks.items():
+            np.save(os.path.join(tmp, field + '.missing.npy'), values)
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': data.version,
+                'rows': len(data),
+                'names': data.names.tolist(),
+                'starts': data.starts.tolist(),
+            }, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp, path)
+
+    def _publish(self, name):
+        path = os.path.join(self.root, CURRENT)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(name)
+        os.replace(path + '.tmp', path)
+
+    def _prune(self, current):
+        """Delete all but the newest KEEP snapshots."""
+        snapshots = [entry for entry in os.listdir(self.root)
+                     if entry.startswith('v') and os.path.isdir(os.path.join(self.root, entry))]
+        snapshots.sort(key=lambda entry: os.path.getmtime(os.path.join(self.root, entry)), reverse=True)
+        for entry in snapshots[KEEP:]:
+            if entry != current:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
@@ -1,110 +1,170 @@
-from flask import Flask, render_template, jsonify, url_for
-import requests
+from flask import (Flask, copy_current_request_context, make_response, render_template, request,
+                   jsonify, url_for)
+from markupsafe import Markup
+import functools
 import os
+import sys
+import threading
+
+# The modules the services share live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import metrics, profiler
+from common.http_client import ServiceClient
+from common.metrics import stage
+from page_cache import PageCache
+from pages import (HISTORY_TABLE_ROWS, analysis_or_empty, company_context, format_number,
+                   home_context, page_result)
 
 app = Flask(__name__)
+metrics.init_app(app, 'web_service')
+profiler.init_app(app)
 
 DATA_SERVICE_URL = os.environ.get('DATA_SERVICE_URL', 'http://localhost:5002')
 ANALYSIS_SERVICE_URL = os.environ.get('ANALYSIS_SERVICE_URL', 'http://localhost:5003')
 
+data_client = ServiceClient(DATA_SERVICE_URL)
+analysis_client = ServiceClient(ANALYSIS_SERVICE_URL)
+page_cache = PageCache()
+
 def get_analysis_data(company):
+    """(analysis, degraded), with the empty analysis if the analysis service failed."""
     try:
-        response = requests.get(f'{ANALYSIS_SERVICE_URL}/api/analysis/{company}')
-        if response.status_code == 200:
-            return response.json()
-        return {
-            'daily': {
-                'sma20': None, 'ema20': None, 'rsi': None,
-                'macd': None, 'signal': None, 'histogram': None,
-                'bollinger': {}
-            }
-        }
+        with stage('fetch_analysis'):
+            return analysis_or_empty(analysis_client.get(f'/api/analysis/{company}'))
     except Exception:
-        return {
-            'daily': {
-                'sma20': None, 'ema20': None, 'rsi': None,
-                'macd': None, 'signal': None, 'histogram': None,
-                'bollinger': {}
-            }
-        }
+        return analysis_or_empty(None)
+
+def data_version():
+    """The data service's current version, polled at most every few seconds; None if unknown."""
+    if page_cache.version_due():
+        try:
+            with stage('fetch_version'):
+                response = data_client.get('/api/version')
+            version = str(response.json()['version']) if response.status_code == 200 else None
+        except Exception:
+            version = None
+        page_cache.set_version(version)
+    return page_cache.data_version
+
+def render_fragment(name, key, version, **context):
+    """Render templates/_<name>.html, reusing the copy rendered from the same data version."""
+    body = page_cache.fragment((name,) + key, version)
+    if body is None:
+        with stage('render_fragment'):
+            body = page_cache.put_fragment((name,) + key, version,
+                                           render_template(f'_{name}.html', **context))
+    return Markup(body)
+
+def render_page(view, kwargs, key, version):
+    """Render the view; successful pages are cached, unless built from a fallback
+    (sent as no-store). Returns (page or None, response)."""
+    response = make_response(view(**kwargs))
+    if response.status_code != 200 or version is None or response.cache_control.no_store:
+        return None, response
+    return page_cache.put(key, version, response.get_data(as_text=True)), response
+
+def page_response(page):
+    response = make_response(page.body)
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    # Browsers revalidate every time, and get a 304 while the page is unchanged
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def cached_page(view):
+    """Serve the view's page from page_cache, re-rendering stale pages in the background."""
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        key = request.full_path
+        version = data_version()
+        page, fresh = page_cache.get(key)
+        if page is None:
+            page, response = render_page(view, kwargs, key, version)
+            if page is None:
+                return response
+        elif not fresh and page_cache.claim_refresh(key):
+            @copy_current_request_context
+            def refresh():
+                try:
+                    render_page(view, kwargs, key, version)
+                finally:
+                    page_cache.release_refresh(key)
+            threading.Thread(target=refresh, daemon=True).start()
+        return page_response(page)
+    return wrapper
 
 @app.route('/')
+@cached_page
 def home():
     try:
-        response = requests.get(f'{DATA_SERVICE_URL}/api/companies')
+        with stage('fetch_data'):
+            response = data_client.get('/api/market/summary', params={'limit': 9})
         if response.status_code != 200:
             return render_template('error.html', message="Cannot load companies"), 500
 
-        companies = response.json()['companies']
-        company_data = []
-
-        for company in companies[:9]:
-            company_response = requests.get(f'{DATA_SERVICE_URL}/api/company/{company}')
-            if company_response.status_code == 200:
-                data = company_response.json()['history'][0]
-                company_data.append({
-                    'name': company,
-                    'last_price': data['Last_Price'],
-                    'change': data['Change_Pct'],
-                    'volume': data['Volume'],
-                    'date': data['Date'],
-                    'high': data['High'],
-                    'low': data['Low']
-                })
-
-        return render_template('index.html',
-                             companies=company_data,
-                             total_volume=sum(c['volume'] for c in company_data))
+        with stage('decode'):
+            context = home_context(response.json())
+        with stage('render'):
+            return render_template('index.html', **context)
 
     except Exception:
         return render_template('error.html',
                              message="An error occurred. Please try again."), 500
 
 @app.route('/company/<company>')
+@cached_page
 def company_detail(company):
     try:
-        response = requests.get(f'{DATA_SERVICE_URL}/api/company/{company}')
+        with stage('fetch_data'):
+            response = data_client.get(f'/api/company/{company}',
+                                       params={'limit': HISTORY_TABLE_ROWS})
         if response.status_code != 200:
             return render_template('error.html',
                                  message=f"Cannot find data for {company}"), response.status_code
 
-        data = response.json()
-        latest = data['history'][0] if data['history'] else None
-        analysis = get_analysis_data(company)
-
-        return render_template('company.html',
-                             company=company,
-                             history=data['history'],
-                             latest=latest,
-                             analysis=analysis)
+        analysis, degraded = get_analysis_data(company)
+        with stage('decode'):
+            context = company_context(company, response.json()['history'], analysis)
+        history_table = render_fragment('history_table', (company,),
+                                        response.headers.get('X-Data-Version'),
+                                        history=context['history'])
+        with stage('render'):
+            return page_result(render_template('company.html', history_table=history_table, **context),
+                               degraded)
 
     except Exception:
         return render_template('error.html',
                              message="An error occurred. Please try again."), 500
 
 @app.route('/analysis/<company>')
+@cached_page
 def analysis(company):
     try:
-        response = requests.get(f'{DATA_SERVICE_URL}/api/company/{company}')
+        # The chart only plots price and volume
+        with stage('fetch_data'):
+            response = data_client.get(f'/api/company/{company}',
+                                       params={'fields': 'Last_Price,Volume'})
         if response.status_code != 200:
             return render_template('error.html',
                                  message=f"Cannot find data for {company}"), response.status_code
 
-        data = response.json()
-        analysis = get_analysis_data(company)
+        with stage('decode'):
+            data = response.json()
+        analysis, degraded = get_analysis_data(company)
+        chart_data = render_fragment('chart_data', (company,), response.headers.get('X-Data-Version'),
+                                     history=data['history'])
 
-        return render_template('analysis.html',
-                             company=company,
-                             history=data['history'],
-                             analysis=analysis)
+        with stage('render'):
+            return page_result(render_template('analysis.html',
+                                               company=company,
+                                               chart_data=chart_data,
+                                               analysis=analysis), degraded)
 
     except Exception:
         return render_template('error.html',
                              message="An error occurred. Please try again."), 500
 
-@app.template_filter('format_number')
-def format_number(value):
-    return "{:,.0f}".format(value)
+app.add_template_filter(format_number, 'format_number')
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5004))
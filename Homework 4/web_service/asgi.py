@@ -0,0 +1,210 @@
+"""Async (ASGI) variant of the web service.
+
+Serves the same routes and templates as app.py, but a page's data and
+analysis requests are sent concurrently with asyncio.gather over pooled
+async clients, so a page takes about as long as its slowest upstream call
+rather than the sum of them. Run it with:
+
+    hypercorn -c file:hypercorn.conf.py asgi:app
+"""
+import asyncio
+import functools
+import os
+import sys
+
+from markupsafe import Markup
+from quart import Quart, copy_current_request_context, make_response, render_template, request
+
+# The modules the services share live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from async_client import AsyncServiceClient
+from common import metrics, profiler
+from common.metrics import stage
+from page_cache import PageCache
+from pages import (HISTORY_TABLE_ROWS, analysis_or_empty, company_context, format_number,
+                   home_context, page_result)
+
+app = Quart(__name__)
+metrics.init_app(app, 'web_service')
+profiler.init_app(app)
+
+DATA_SERVICE_URL = os.environ.get('DATA_SERVICE_URL', 'http://localhost:5002')
+ANALYSIS_SERVICE_URL = os.environ.get('ANALYSIS_SERVICE_URL', 'http://localhost:5003')
+
+data_client = AsyncServiceClient(DATA_SERVICE_URL)
+analysis_client = AsyncServiceClient(ANALYSIS_SERVICE_URL)
+page_cache = PageCache()
+# Background page renders, referenced until they finish
+refreshes = set()
+
+
+@app.before_serving
+async def open_clients():
+    await data_client.open()
+    await analysis_client.open()
+
+
+@app.after_serving
+async def close_clients():
+    await data_client.close()
+    await analysis_client.close()
+
+
+async def timed(name, awaitable):
+    """Await awaitable as a stage of the current request."""
+    with stage(name):
+        return await awaitable
+
+
+async def fetch_page_data(company, params):
+    """Request a company's history and its analysis at the same time.
+
+    Returns (response, analysis, degraded). A failed analysis request falls
+    back to the empty analysis, with degraded set; a failed data request is
+    raised.
+    """
+    response, analysis = await asyncio.gather(
+        timed('fetch_data', data_client.get(f'/api/company/{company}', params=params)),
+        timed('fetch_analysis', analysis_client.get(f'/api/analysis/{company}')),
+        return_exceptions=True)
+    if isinstance(response, Exception):
+        raise response
+    return (response,) + analysis_or_empty(analysis)
+
+
+async def data_version():
+    """The data service's current version, polled at most every few seconds; None if unknown."""
+    if page_cache.version_due():
+        try:
+            response = await timed('fetch_version', data_client.get('/api/version'))
+            version = str(response.json()['version']) if response.status_code == 200 else None
+        except Exception:
+            version = None
+        page_cache.set_version(version)
+    return page_cache.data_version
+
+
+async def render_fragment(name, key, version, **context):
+    """Render templates/_<name>.html, reusing the copy rendered from the same data version."""
+    body = page_cache.fragment((name,) + key, version)
+    if body is None:
+        with stage('render_fragment'):
+            body = page_cache.put_fragment((name,) + key, version,
+                                           await render_template(f'_{name}.html', **context))
+    return Markup(body)
+
+
+async def render_page(view, kwargs, key, version):
+    """Render the view; successful pages are cached, unless built from a fallback
+    (sent as no-store). Returns (page or None, response)."""
+    response = await make_response(await view(**kwargs))
+    if response.status_code != 200 or version is None or response.cache_control.no_store:
+        return None, response
+    return page_cache.put(key, version, await response.get_data(as_text=True)), response
+
+
+async def page_response(page):
+    response = await make_response(page.body)
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    # Browsers revalidate every time, and get a 304 while the page is unchanged
+    response.cache_control.no_cache = True
+    return await response.make_conditional(request)
+
+
+def cached_page(view):
+    """Serve the view's page from page_cache, re-rendering stale pages in the background."""
+    @functools.wraps(view)
+    async def wrapper(**kwargs):
+        key = request.full_path
+        version = await data_version()
+        page, fresh = page_cache.get(key)
+        if page is None:
+            page, response = await render_page(view, kwargs, key, version)
+            if page is None:
+                return response
+        elif not fresh and page_cache.claim_refresh(key):
+            @copy_current_request_context
+            async def refresh():
+                try:
+                    await render_page(view, kwargs, key, version)
+                finally:
+                    page_cache.release_refresh(key)
+            task = asyncio.ensure_future(refresh())
+            refreshes.add(task)
+            task.add_done_callback(refreshes.discard)
+        return await page_response(page)
+    return wrapper
+
+
+@app.route('/')
+@cached_page
+async def home():
+    try:
+        response = await timed('fetch_data', data_client.get('/api/market/summary', params={'limit': 9}))
+        if response.status_code != 200:
+            return await render_template('error.html', message="Cannot load companies"), 500
+
+        with stage('decode'):
+            context = home_context(response.json())
+        with stage('render'):
+            return await render_template('index.html', **context)
+
+    except Exception:
+        return await render_template('error.html',
+                                     message="An error occurred. Please try again."), 500
+
+
+@app.route('/company/<company>')
+@cached_page
+async def company_detail(company):
+    try:
+        response, analysis, degraded = await fetch_page_data(company, {'limit': HISTORY_TABLE_ROWS})
+        if response.status_code != 200:
+            return await render_template('error.html',
+                                         message=f"Cannot find data for {company}"), response.status_code
+
+        with stage('decode'):
+            context = company_context(company, response.json()['history'], analysis)
+        history_table = await render_fragment('history_table', (company,),
+                                              response.headers.get('X-Data-Version'),
+                                              history=context['history'])
+        with stage('render'):
+            return page_result(await render_template('company.html', history_table=history_table, **context),
+                               degraded)
+
+    except Exception:
+        return await render_template('error.html',
+                                     message="An error occurred. Please try again."), 500
+
+
+@app.route('/analysis/<company>')
+@cached_page
+async def analysis(company):
+    try:
+        # The chart only plots price and volume
+        response, analysis, degraded = await fetch_page_data(company, {'fields': 'Last_Price,Volume'})
+        if response.status_code != 200:
+            return await render_template('error.html',
+                                         message=f"Cannot find data for {company}"), response.status_code
+
+        with stage('decode'):
+            history = response.json()['history']
+        chart_data = await render_fragment('chart_data', (company,),
+                                           response.headers.get('X-Data-Version'),
+                                           history=history)
+        with stage('render'):
+            return page_result(await render_template('analysis.html',
+                                                     company=company,
+                                                     chart_data=chart_data,
+                                                     analysis=analysis), degraded)
+
+    except Exception:
+        return await render_template('error.html',
+                                     message="An error occurred. Please try again."), 500
+
+app.add_template_filter(format_number, 'format_number')
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5004))
+    app.run(host='0.0.0.0', port=port)
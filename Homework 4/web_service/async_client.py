@@ -0,0 +1,71 @@
+"""Pooled asyncio HTTP client for the async web app (asgi.py).
+
+The asyncio counterpart of http_client.ServiceClient, with the same
+timeouts, retry policy and circuit breaker settings, built on one
+httpx.AsyncClient per service so concurrent requests share a bounded
+keep-alive pool, and the same ETag revalidation and X-Request-ID passing. Clients belong to the
+event loop they were opened on, so the app opens them when it starts
+serving and closes them on shutdown.
+"""
+import asyncio
+
+import httpx
+
+from common.http_client import (CONNECT_TIMEOUT, POOL_SIZE, READ_TIMEOUT, RETRIES, TRANSIENT_STATUSES,
+                                CircuitBreaker, CircuitOpenError, ETagCache)
+from common.metrics import request_id_headers
+
+BACKOFF_FACTOR = 0.1
+
+
+class AsyncServiceClient:
+    def __init__(self, base_url, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, pool_size=POOL_SIZE, breaker=None, etags=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self.etags = etags or ETagCache()
+        self.client = None
+
+    async def open(self):
+        self.client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                        limits=self.limits)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def get(self, path, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+
+        kwargs['headers'] = request_id_headers(kwargs.get('headers'))
+        url = str(httpx.URL(f'{self.base_url}{path}', params=kwargs.get('params')))
+        cached = self.etags.revalidate(url, kwargs)
+        try:
+            response = await self._get_with_retries(path, **kwargs)
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code in TRANSIENT_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return self.etags.resolve(url, response, cached)
+
+    async def _get_with_retries(self, path, **kwargs):
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await self.client.get(path, **kwargs)
+            except httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if last or response.status_code not in TRANSIENT_STATUSES:
+                    return response
+            await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
@@ -0,0 +1,12 @@
+import os
+import shutil
+import tempfile
+
+# Serves asgi.py, the async variant of the web service
+bind = [f"0.0.0.0:{os.environ.get('PORT', 5004)}"]
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+# Workers add up each other's request metrics through files here (see
+# common/metrics.py); counts from an earlier run must not be added to this one's
+metrics_dir = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'web_service_metrics'))
+shutil.rmtree(metrics_dir, ignore_errors=True)
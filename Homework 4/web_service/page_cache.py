@@ -0,0 +1,122 @@
+"""Cache of rendered pages and page fragments.
+
+Pages are keyed by their route (path and query string) and remember the
+data version they were rendered from. A page is fresh while it is younger
+than `ttl` and the data service still reports that version. After that it
+is stale: for another `stale_ttl` seconds it is still served at once while
+a single background render replaces it (stale-while-revalidate); older
+pages are rendered again before responding.
+
+Fragments, such as the company page's history table or the analysis
+chart data, are a function of the data alone, so they are keyed by name
+and data version and never go stale. They let a page whose TTL ran out be
+rendered again without rebuilding its heaviest parts.
+
+Both kinds of entries share one LRU bound. The cache itself does no I/O;
+app.py and asgi.py poll the data version and render pages their own way.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 256))
+PAGE_CACHE_TTL = float(os.environ.get('PAGE_CACHE_TTL', 60))
+PAGE_STALE_TTL = float(os.environ.get('PAGE_STALE_TTL', 3600))
+DATA_VERSION_TTL = float(os.environ.get('DATA_VERSION_TTL', 5))
+
+
+class CachedPage:
+    def __init__(self, body, version):
+        self.body = body
+        self.version = version
+        self.etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        # HTTP dates have one-second resolution
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.stored_at = time.monotonic()
+
+    def age(self):
+        return time.monotonic() - self.stored_at
+
+
+class PageCache:
+    def __init__(self, maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL, stale_ttl=PAGE_STALE_TTL,
+                 version_ttl=DATA_VERSION_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.version_ttl = version_ttl
+        self.entries = OrderedDict()
+        self.refreshing = set()
+        self.data_version = None
+        self.version_checked_at = None
+        self.lock = threading.Lock()
+
+    def version_due(self):
+        """Whether the data version should be polled again."""
+        return self.version_checked_at is None or time.monotonic() - self.version_checked_at >= self.version_ttl
+
+    def set_version(self, version):
+        with self.lock:
+            self.data_version = version
+            self.version_checked_at = time.monotonic()
+
+    def get(self, key):
+        """Return (page, fresh), or (None, False) if there is no page worth serving."""
+        with self.lock:
+            page = self.entries.get(('page', key))
+            if page is None:
+                return None, False
+            age = page.age()
+            if age >= self.ttl + self.stale_ttl:
+                del self.entries[('page', key)]
+                return None, False
+            self.entries.move_to_end(('page', key))
+            fresh = age < self.ttl and self.data_version is not None and page.version == self.data_version
+            return page, fresh
+
+    def put(self, key, version, body):
+        page = CachedPage(body, version)
+        self._store(('page', key), page)
+        return page
+
+    def fragment(self, key, version):
+        """Return the fragment rendered from this data version, or None."""
+        if version is None:
+            return None
+        with self.lock:
+            fragment = self.entries.get(('fragment', key))
+            if fragment is None or fragment.version != version:
+                return None
+            self.entries.move_to_end(('fragment', key))
+            return fragment.body
+
+    def put_fragment(self, key, version, body):
+        if version is not None:
+            self._store(('fragment', key), CachedPage(body, version))
+        return body
+
+    def _store(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def claim_refresh(self, key):
+        """Return True if the caller should re-render a stale page, False if that is under way."""
+        with self.lock:
+            if key in self.refreshing:
+                return False
+            self.refreshing.add(key)
+            return True
+
+    def release_refresh(self, key):
+        with self.lock:
+            self.refreshing.discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
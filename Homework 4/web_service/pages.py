@@ -0,0 +1,69 @@
+"""Page building shared by the Flask app (app.py) and its async twin (asgi.py).
+
+Both apps render the same templates from the same upstream responses;
+only how they call the data and analysis services differs.
+"""
+import os
+
+# Rows shown in the company page's history table (about a year of sessions)
+HISTORY_TABLE_ROWS = int(os.environ.get('HISTORY_TABLE_ROWS', 250))
+
+# Shown when the analysis service can't provide an analysis
+EMPTY_ANALYSIS = {
+    'daily': {
+        'sma20': None, 'ema20': None, 'rsi': None,
+        'macd': None, 'signal': None, 'histogram': None,
+        'bollinger': {}
+    }
+}
+
+# Unknown numbers arrive as null; the pages show them as 0
+DISPLAY_MISSING = {'Last_Price': 0.0, 'Change_Pct': 0.0, 'Volume': 0, 'High': 0.0, 'Low': 0.0}
+
+
+def display_record(record):
+    return {key: DISPLAY_MISSING[key] if value is None and key in DISPLAY_MISSING else value
+            for key, value in record.items()}
+
+
+# Sent with pages built from a fallback, so neither the page cache nor browsers keep them
+DEGRADED_HEADERS = {'Cache-Control': 'no-store'}
+
+
+def analysis_or_empty(response):
+    """(analysis, degraded): the analysis from an analysis service response,
+    or EMPTY_ANALYSIS and True if it failed."""
+    if response is None or isinstance(response, Exception) or response.status_code != 200:
+        return EMPTY_ANALYSIS, True
+    return response.json(), False
+
+
+def page_result(body, degraded):
+    """A view's return value for a rendered page, marked no-store if it was built from a fallback."""
+    return (body, 200, DEGRADED_HEADERS) if degraded else body
+
+
+def home_context(summary):
+    company_data = []
+    for data in map(display_record, summary['latest']):
+        company_data.append({
+            'name': data['Company'],
+            'last_price': data['Last_Price'],
+            'change': data['Change_Pct'],
+            'volume': data['Volume'],
+            'date': data['Date'],
+            'high': data['High'],
+            'low': data['Low']
+        })
+    # Like the Homework 3 home page: the volume of the tiles shown
+    return {'companies': company_data, 'total_volume': summary['latest_volume']}
+
+
+def company_context(company, history, analysis):
+    history = [display_record(record) for record in history]
+    latest = history[0] if history else None
+    return {'company': company, 'history': history, 'latest': latest, 'analysis': analysis}
+
+
+def format_number(value):
+    return "{:,.0f}".format(value)
@@ -0,0 +1,154 @@
+"""Timing, result files and service loading for benchmarks/run.py."""
+import importlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy
+import pandas
+from werkzeug.serving import make_server
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_modules(directory, *names):
+    """Import modules from one of the project's app directories.
+
+    The apps have modules with the same names (app, dataset...), so each
+    directory is imported with none of the other directories' modules in
+    sys.modules, and its modules are taken out again afterwards. The
+    services' shared package (Homework 4/common) is imported once for all. The returned modules keep working: they hold references to
+    everything they imported.
+    """
+    local = {entry[:-3] if entry.endswith('.py') else entry for entry in os.listdir(directory)
+             if entry.endswith('.py') or os.path.exists(os.path.join(directory, entry, '__init__.py'))}
+
+    def take(modules):
+        return {name: modules.pop(name) for name in list(modules) if name.split('.')[0] in local}
+
+    saved = take(sys.modules)
+    sys.path.insert(0, directory)
+    try:
+        modules = [importlib.import_module(name) for name in names]
+    finally:
+        sys.path.remove(directory)
+        take(sys.modules)
+        sys.modules.update(saved)
+    return modules[0] if len(modules) == 1 else modules
+
+
+class Server:
+    """Serves a WSGI app on a free local port from a background thread."""
+
+    def __init__(self, app):
+        # Request lines would drown out the results
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def measure(func, repeat=5, setup=None, min_time=0.05, warmup=1):
+    """Time func() and return per-call statistics in milliseconds.
+
+    Each of the `repeat` runs calls func enough times to last at least
+    `min_time` seconds, so fast functions are not lost in timer noise.
+    With a `setup` (run untimed before every call, e.g. to clear a cache)
+    every call is timed on its own.
+    """
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        func()
+
+    number = 1
+    if setup is None:
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= min_time or number >= 1 << 20:
+                break
+            number *= 2
+
+    times = []
+    for _ in range(repeat):
+        if setup is None:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            elapsed = time.perf_counter() - start
+        else:
+            setup()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        times.append(elapsed / number * 1000)
+
+    return {
+        'median_ms': statistics.median(times),
+        'min_ms': min(times),
+        'mean_ms': statistics.mean(times),
+        'stdev_ms': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'runs': repeat,
+        'calls_per_run': number,
+    }
+
+
+def environment():
+    """What a result file was measured on, to judge whether two files are comparable."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+    }
+
+
+def write_results(path, meta, results):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+
+def read_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.1):
+    """Match results against a baseline file's.
+
+    Returns (name, baseline_ms, current_ms, ratio, verdict) for every
+    benchmark in both, where the verdict is 'slower' or 'faster' when the
+    medians differ by more than `threshold` (a fraction), else ''.
+    """
+    rows = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        before, after = previous['median_ms'], result['median_ms']
+        ratio = after / before if before else float('inf')
+        verdict = 'slower' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else ''
+        rows.append((name, before, after, ratio, verdict))
+    return rows
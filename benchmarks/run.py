@@ -0,0 +1,288 @@
+"""Benchmark the data loading, lookup, serialization, indicator and API hot paths.
+
+Synthetic data in the scraper's schema (see synthetic.py) is written to a
+temporary CSV file and store, and every benchmark runs against it:
+
+    load        CSV and store reads (csv_load is the whole CSV path the
+                store replaced), building the in-memory datasets
+    lookup      per-company and market selections
+    serialize   the history/latest/market encoders, JSON and packed columns
+    indicators  TechnicalAnalysis, the analysis_service strategies, the
+                cross-sectional and incremental indicators, the backtest
+    api         Flask test-client requests to every service and to the
+                Homework 3 app; data_service and analysis_service are also
+                served on local ports for the services that call them.
+                The *_uncached variants clear the service's own result or
+                page cache before every request (its upstream requests
+                still revalidate with ETags)
+
+Results go to a JSON file, and --compare lists the benchmarks whose median
+moved by more than --threshold against an earlier file (exiting with 1 if
+any got slower):
+
+    python benchmarks/run.py --issuers 50 --years 10 --output before.json
+    python benchmarks/run.py --issuers 50 --years 10 --output after.json --compare before.json
+
+The api group imports every app, so it needs all their requirements.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from harness import (REPO_DIR, Server, compare, environment, load_modules, measure, read_results,
+                     write_results)
+from synthetic import MSEStore, generate, write_csv, write_store
+
+GROUPS = ['load', 'lookup', 'serialize', 'indicators', 'api']
+HOMEWORK3_DIR = os.path.join(REPO_DIR, 'Homework 3')
+SERVICES_DIR = os.path.join(REPO_DIR, 'Homework 4')
+STRATEGY_NAMES = ['sma', 'rsi', 'macd', 'bollinger']
+
+# The modules the services share, which the apps put on the path themselves
+sys.path.insert(0, SERVICES_DIR)
+from common import cross_section, wire  # noqa: E402
+
+
+class Suite:
+    def __init__(self, groups, repeat):
+        self.groups = groups
+        self.repeat = repeat
+        self.results = {}
+
+    def bench(self, group, name, func, setup=None):
+        if group not in self.groups:
+            return
+        result = measure(func, self.repeat, setup)
+        key = f'{group}/{name}'
+        self.results[key] = dict(result, group=group)
+        print(f"  {key:<48} {result['median_ms']:10.3f} ms")
+
+
+def get(client, path, status=200, **kwargs):
+    """A test-client GET that fails the run if the endpoint does not answer as expected."""
+    def request():
+        response = client.get(path, **kwargs)
+        assert response.status_code == status, f'{path}: {response.status_code}'
+        return response
+    return request
+
+
+def prepare_workspace(workdir, df):
+    """Write the CSV file and the store where the apps look for them (relative to workdir)."""
+    csv_path = os.path.join(workdir, 'mse_data.csv')
+    write_csv(df, csv_path)
+    store_path = os.path.join(workdir, 'data', 'mse_store')
+    write_store(df, store_path)
+    # data_service reads ./data/mse_store, the Homework 3 app ./mse_store
+    try:
+        os.symlink(store_path, os.path.join(workdir, 'mse_store'))
+    except OSError:
+        write_store(df, os.path.join(workdir, 'mse_store'))
+    return csv_path, MSEStore(store_path)
+
+
+def csv_load(csv_path):
+    """The whole dataset the way the apps loaded it before the store: parsed, dated and sorted."""
+    df = pd.read_csv(csv_path)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.sort_values(['Company', 'Date'], ascending=[True, False], ignore_index=True)
+
+
+def bench_data(suite, csv_path, store, company):
+    ds_app, ds_dataset = load_modules(os.path.join(SERVICES_DIR, 'data_service'), 'app', 'dataset')
+    hw3_app, hw3_dataset = load_modules(HOMEWORK3_DIR, 'app', 'dataset')
+    frame = store.read_all()
+
+    suite.bench('load', 'csv_read', lambda: pd.read_csv(csv_path))
+    suite.bench('load', 'csv_load', lambda: csv_load(csv_path))
+    suite.bench('load', 'store_read_all', store.read_all)
+    if 'load/csv_load' in suite.results:
+        speedup = suite.results['load/csv_load']['median_ms'] / suite.results['load/store_read_all']['median_ms']
+        print(f"  store_read_all is {speedup:.1f}x faster than csv_load")
+    suite.bench('load', 'store_read_company', lambda: store.read_company(company))
+    suite.bench('load', 'data_service_from_frame', lambda: ds_dataset.IndexedDataset.from_frame(frame, 1))
+    suite.bench('load', 'data_service_load_data', ds_app.data_service.load_data)
+    suite.bench('load', 'homework3_index', lambda: hw3_dataset.IndexedDataset(frame))
+
+    data = ds_app.data_service.data
+    hw3_data = hw3_dataset.IndexedDataset(frame)
+    last_year = str(np.datetime64(int(data.columns['Date'].max()) - 365, 'D'))
+    suite.bench('lookup', 'data_service_company', lambda: data.company(company))
+    suite.bench('lookup', 'data_service_query',
+                lambda: data.query(company, start=last_year, limit=100))
+    suite.bench('lookup', 'data_service_market_history',
+                lambda: data.market_history(data.companies, limit=100))
+    suite.bench('lookup', 'homework3_company', lambda: hw3_data.company(company))
+    suite.bench('lookup', 'homework3_load_company_data', lambda: hw3_app.load_company_data(company))
+
+    rows = data.company(company)
+    market, companies, lengths = data.market_history(data.companies, limit=500)
+    fields = ds_dataset.HISTORY_FIELDS
+    packed = ds_dataset.pack_columns(market, fields, companies=companies, lengths=lengths)
+    company_df = hw3_data.company(company)
+    suite.bench('serialize', 'encode_history', lambda: ds_dataset.encode_history(rows))
+    suite.bench('serialize', 'encode_history_price_only',
+                lambda: ds_dataset.encode_history(rows, ['Date', 'Last_Price']))
+    suite.bench('serialize', 'to_records_latest',
+                lambda: ds_dataset.to_records(data.latest(data.companies), ['Company'] + fields))
+    suite.bench('serialize', 'encode_columns_market',
+                lambda: ds_dataset.encode_columns(market, fields, companies, lengths))
+    suite.bench('serialize', 'pack_columns_market',
+                lambda: ds_dataset.pack_columns(market, fields, companies=companies, lengths=lengths))
+    suite.bench('serialize', 'unpack_columns_market', lambda: wire.unpack(packed))
+    suite.bench('serialize', 'homework3_history_records',
+                lambda: hw3_app.history_records(company_df, '%d.%m.%Y', list(hw3_app.DISPLAY_MISSING),
+                                                missing=hw3_app.DISPLAY_MISSING))
+    return ds_app, hw3_app
+
+
+def bench_indicators(suite, store, company):
+    technical, backtest = load_modules(HOMEWORK3_DIR, 'analysis.technical', 'analysis.backtest')
+    strategies, incremental = load_modules(
+        os.path.join(SERVICES_DIR, 'analysis_service'), 'strategies', 'incremental')
+    frame = store.read_all()
+
+    company_df = store.read_company(company)
+    daily = technical.TechnicalAnalysis(company_df).df
+    TechnicalAnalysis = technical.TechnicalAnalysis
+    suite.bench('indicators', 'technical_init', lambda: TechnicalAnalysis(company_df))
+    for name, compute in [
+            ('sma20', lambda analyzer: analyzer.calculate_sma(20)),
+            ('ema20', lambda analyzer: analyzer.calculate_ema(20)),
+            ('rsi14', lambda analyzer: analyzer.calculate_rsi(14)),
+            ('macd', lambda analyzer: analyzer.calculate_macd()),
+            ('bollinger', lambda analyzer: analyzer.calculate_bollinger_bands()),
+            ('stochastic', lambda analyzer: analyzer.calculate_stochastic()),
+            ('signal_codes', lambda analyzer: analyzer.signal_codes()),
+            ('generate_signals', lambda analyzer: analyzer.generate_signals()),
+            ('analyze_all_periods', lambda analyzer: analyzer.analyze_all_periods())]:
+        # A fresh analyzer each time, so nothing is served from its series cache
+        suite.bench('indicators', f'technical_{name}',
+                    lambda compute=compute: compute(TechnicalAnalysis.from_indexed(daily)))
+
+    # The analysis service works on the last 500 prices, oldest first
+    history = daily.reset_index()[['Date', 'Last_Price']].tail(500).astype({'Last_Price': float})
+    for name in STRATEGY_NAMES:
+        strategy = strategies.AnalysisFactory.create_strategy(name)
+        suite.bench('indicators', f'strategy_{name}', lambda strategy=strategy: strategy.analyze(history))
+    pipeline = strategies.AnalysisFactory.create_pipeline(STRATEGY_NAMES)
+    suite.bench('indicators', 'strategy_pipeline', lambda: pipeline.run(history))
+
+    dates = history['Date'].dt.strftime('%Y-%m-%d').tolist()
+    prices = history['Last_Price'].tolist()
+    suite.bench('indicators', 'incremental_from_history',
+                lambda: incremental.IndicatorState.from_history(dates, prices))
+
+    matrix = cross_section.price_matrix(frame, limit=500)
+    suite.bench('indicators', 'cross_section_market', lambda: cross_section.analyze_matrix(matrix))
+    full_matrix = cross_section.price_matrix(frame)
+    suite.bench('indicators', 'backtest_default_params',
+                lambda: [backtest.backtest(full_matrix, strategy, [params])
+                         for strategy, params in backtest.DEFAULT_PARAMS.items()])
+
+
+def bench_api(suite, ds_app, hw3_app, company):
+    client = ds_app.app.test_client()
+    columns = {'Accept': 'application/x-mse-columns'}
+    for name, path, kwargs in [
+            ('companies', '/api/companies', {}),
+            ('company', f'/api/company/{company}', {}),
+            ('company_limit100', f'/api/company/{company}?limit=100', {}),
+            ('company_columns', f'/api/company/{company}', {'headers': columns}),
+            ('company_gzip', f'/api/company/{company}', {'headers': {'Accept-Encoding': 'gzip'}}),
+            ('latest', '/api/latest', {}),
+            ('market_summary', '/api/market/summary', {}),
+            ('market_history', '/api/market/history?limit=100&fields=Last_Price', {}),
+            ('market_history_columns', '/api/market/history?limit=100&fields=Last_Price',
+             {'headers': columns})]:
+        suite.bench('api', f'data_service_{name}', get(client, path, **kwargs))
+
+    data_server = Server(ds_app.app)
+    os.environ['DATA_SERVICE_URL'] = data_server.url
+    analysis_app = load_modules(os.path.join(SERVICES_DIR, 'analysis_service'), 'app')
+    analysis_server = Server(analysis_app.app)
+    os.environ['ANALYSIS_SERVICE_URL'] = analysis_server.url
+    web_app = load_modules(os.path.join(SERVICES_DIR, 'web_service'), 'app')
+
+    try:
+        def forget_results():
+            analysis_app.result_cache.clear()
+            analysis_app.states.clear()
+
+        client = analysis_app.app.test_client()
+        for name, path in [('company', f'/api/analysis/{company}'), ('batch', '/api/analysis/batch')]:
+            suite.bench('api', f'analysis_service_{name}', get(client, path))
+            suite.bench('api', f'analysis_service_{name}_uncached', get(client, path), setup=forget_results)
+
+        client = web_app.app.test_client()
+        for name, path in [('home', '/'), ('company', f'/company/{company}'),
+                           ('analysis', f'/analysis/{company}')]:
+            suite.bench('api', f'web_service_{name}', get(client, path))
+            suite.bench('api', f'web_service_{name}_uncached', get(client, path),
+                        setup=web_app.page_cache.clear)
+    finally:
+        analysis_server.close()
+        data_server.close()
+
+    client = hw3_app.app.test_client()
+    for name, path in [('home', '/'), ('company', f'/company/{company}'), ('analysis', f'/analysis/{company}')]:
+        suite.bench('api', f'homework3_{name}', get(client, path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=50)
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=GROUPS, help="groups to run")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="an earlier results file")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative change of the median reported by --compare")
+    args = parser.parse_args()
+
+    df = generate(args.issuers, args.years, args.seed)
+    # The company with the longest history
+    company = df['Company'].value_counts().idxmax()
+    print(f"{len(df)} rows, {args.issuers} issuers x {args.years:g} years; company benchmarks use {company}")
+
+    suite = Suite(args.only, args.repeat)
+    output = os.path.abspath(args.output)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path, store = prepare_workspace(workdir, df)
+        # The apps find the store and keep their state relative to the working directory
+        os.chdir(workdir)
+        os.environ['ANALYSIS_STATE_DIR'] = os.path.join(workdir, 'analysis_state')
+        try:
+            ds_app, hw3_app = bench_data(suite, csv_path, store, company)
+            if 'indicators' in args.only:
+                bench_indicators(suite, store, company)
+            if 'api' in args.only:
+                bench_api(suite, ds_app, hw3_app, company)
+        finally:
+            os.chdir(cwd)
+
+    meta = dict(environment(), issuers=args.issuers, years=args.years, seed=args.seed,
+                rows=len(df), repeat=args.repeat, company=company)
+    write_results(output, meta, suite.results)
+    print(f"Wrote {len(suite.results)} results to {output}")
+
+    if args.compare:
+        rows = compare(suite.results, read_results(args.compare), args.threshold)
+        changed = [row for row in rows if row[4]]
+        print(f"{len(changed)} of {len(rows)} benchmarks changed by more than {args.threshold:.0%}:")
+        for name, before, after, ratio, verdict in changed:
+            print(f"  {name:<48} {before:10.3f} -> {after:10.3f} ms  {ratio:5.2f}x  {verdict}")
+        if any(verdict == 'slower' for *_, verdict in changed):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Synthetic MSE-shaped trading data for the benchmarks.
+
+Rows have the scraper's exact columns (mse_parsers.COLUMNS) and value
+shapes: a row per weekday from each issuer's listing date, prices with two
+decimals, and whole-number volumes and turnovers. Issuers differ the way
+the real ones do: some list partway through the period, some trade every
+day and others only now and then, and prices run from tens to tens of
+thousands of denars. On days without trades, Last_Price repeats the last
+trade, Volume and Turnover are 0 and High/Low/Average are missing.
+
+    python benchmarks/synthetic.py --issuers 50 --years 10 --csv mse_data.csv --store mse_store
+"""
+import argparse
+import os
+import string
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Homework 1'))
+from mse_parsers import COLUMNS  # noqa: E402
+from mse_storage import MSEStore  # noqa: E402
+
+END_DATE = date(2024, 12, 31)
+
+
+def issuer_codes(count, rng):
+    """Unique 3-4 letter tickers, like ALK or KMB."""
+    letters = np.array(list(string.ascii_uppercase))
+    codes = []
+    while len(codes) < count:
+        code = ''.join(rng.choice(letters, size=rng.integers(3, 5)))
+        if code not in codes:
+            codes.append(code)
+    return sorted(codes)
+
+
+def issuer_history(company, days, rng):
+    """One issuer's rows from its listing date to the end of the period."""
+    # Most issuers have the whole history; the rest list partway through
+    if rng.random() < 0.3:
+        days = days[rng.integers(0, len(days) * 3 // 4):]
+    bars = len(days)
+    traded = rng.random(bars) < rng.uniform(0.2, 1.0)
+    traded[0] = True
+
+    volatility = rng.uniform(0.005, 0.03)
+    moves = np.where(traded, rng.normal(0.0002, volatility, bars), 0.0)
+    close = np.round(np.exp(rng.uniform(np.log(50), np.log(40000)) + np.cumsum(moves)), 2)
+    previous = np.r_[close[0], close[:-1]]
+    change = np.round((close / previous - 1) * 100, 2)
+
+    spread = np.abs(rng.normal(0, volatility / 2, (2, bars)))
+    high = np.round(np.maximum(close, previous) * (1 + spread[0]), 2)
+    low = np.round(np.minimum(close, previous) * (1 - spread[1]), 2)
+    average = np.round((high + low + close) / 3, 2)
+    volume = np.where(traded, np.ceil(rng.lognormal(5, 1.5, bars)), 0)
+    turnover = np.round(volume * average)
+    # Block trades are counted in the total but not in the regular turnover
+    blocks = traded & (rng.random(bars) < 0.02)
+    total_turnover = turnover + np.where(blocks, np.round(rng.lognormal(14, 1, bars)), 0)
+
+    no_trade = np.where(traded, 1.0, np.nan)
+    return pd.DataFrame({
+        'Date': days.strftime('%Y-%m-%d'),
+        'Company': company,
+        'Last_Price': close,
+        'High': high * no_trade,
+        'Low': low * no_trade,
+        'Average': average * no_trade,
+        'Change_Pct': change,
+        'Volume': volume,
+        'Turnover': np.where(traded, turnover, 0),
+        'Total_Turnover': total_turnover,
+    }, columns=COLUMNS)
+
+
+def generate(issuers=50, years=10, seed=0, end=END_DATE):
+    """Rows of `issuers` companies over `years` years, newest first per company, as the scraper saves them."""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(end=pd.Timestamp(end), periods=int(years * 261))
+    frames = [issuer_history(company, days, rng)[::-1] for company in issuer_codes(issuers, rng)]
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_csv(df, path):
+    df.to_csv(path, index=False)
+
+
+def write_store(df, root):
+    MSEStore(root).write(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic MSE trading data")
+    parser.add_argument('--issuers', type=int, default=50)
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv', help="write the rows to this CSV file")
+    parser.add_argument('--store', help="write the rows to this store directory")
+    args = parser.parse_args()
+    if not args.csv and not args.store:
+        parser.error("give --csv and/or --store")
+
+    df = generate(args.issuers, args.years, args.seed)
+    if args.csv:
+        write_csv(df, args.csv)
+    if args.store:
+        write_store(df, args.store)
+    print(f"Generated {len(df)} rows for {df['Company'].nunique()} companies")
+
+
+if __name__ == '__main__':
+    main()
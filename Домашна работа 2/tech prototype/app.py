@@ -1,24 +1,32 @@
 from flask import Flask, render_template, jsonify
 import pandas as pd
 import os
+import sys
+
+HOMEWORK1_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Homework 1')
+sys.path.insert(0, HOMEWORK1_DIR)
+from mse_storage import find_store
 
 app = Flask(__name__)
 
 
+def get_store():
+    return find_store(['mse_store', os.path.join(HOMEWORK1_DIR, 'mse_store')])
+
+
 def load_data():
     try:
         print(f"Current working directory: {os.getcwd()}")
-        print(f"Looking for mse_data.csv...")
+        print(f"Looking for mse_store...")
 
-        if not os.path.exists('mse_data.csv'):
-            print("Error: mse_data.csv not found!")
+        store = get_store()
+        if store is None:
+            print("Error: mse_store not found!")
             return pd.DataFrame()
 
-        df = pd.read_csv('mse_data.csv')
+        df = store.read_all()
         print(f"Successfully loaded data with shape: {df.shape}")
 
-        df['Date'] = pd.to_datetime(df['Date'])
-
         df = df.sort_values('Date', ascending=False)
 
         return df
@@ -26,6 +34,10 @@ def load_data():
         print(f"Error loading data: {e}")
         return pd.DataFrame()
 
+def number(value):
+    """The store keeps unknown numbers as missing; the pages show them as 0."""
+    return 0.0 if pd.isna(value) else float(value)
+
 @app.template_filter('format_number')
 def format_number(value):
     return "{:,.0f}".format(value)
@@ -43,15 +55,15 @@ def home():
 
     for company in companies:
         company_df = df[df['Company'] == company].iloc[0]
-        total_volume += float(company_df['Volume'])
+        total_volume += number(company_df['Volume'])
         company_data.append({
             'name': company,
-            'last_price': float(company_df['Last_Price']),
-            'change': float(company_df['Change_Pct']),
-            'volume': float(company_df['Volume']),
+            'last_price': number(company_df['Last_Price']),
+            'change': number(company_df['Change_Pct']),
+            'volume': number(company_df['Volume']),
             'date': company_df['Date'].strftime('%d.%m.%Y'),
-            'high': float(company_df['High']),
-            'low': float(company_df['Low'])
+            'high': number(company_df['High']),
+            'low': number(company_df['Low'])
         })
 
     return render_template('index.html',
@@ -62,12 +74,11 @@ def home():
 @app.route('/company/<company>')
 def company_detail(company):
     print(f"Loading data for company: {company}")
-    df = load_data()
-
-    if df.empty:
+    store = get_store()
+    if store is None:
         return "Error: Could not load data"
 
-    company_df = df[df['Company'] == company].copy()
+    company_df = store.read_company(company)
     if company_df.empty:
         return f"No data found for company {company}"
 
@@ -75,11 +86,11 @@ def company_detail(company):
     for _, row in company_df.iterrows():
         history.append({
             'Date': row['Date'].strftime('%d.%m.%Y'),
-            'Last_Price': float(row['Last_Price']),
-            'Change_Pct': float(row['Change_Pct']),
-            'Volume': float(row['Volume']),
-            'High': float(row['High']),  
-            'Low': float(row['Low'])
+            'Last_Price': number(row['Last_Price']),
+            'Change_Pct': number(row['Change_Pct']),
+            'Volume': number(row['Volume']),
+            'High': number(row['High']),  
+            'Low': number(row['Low'])
         })
 
     latest = history[0] if history else None
@@ -104,7 +115,7 @@ def debug_info():
     return jsonify({
         "data_shape": df.shape,
         "columns": df.columns.tolist(),
-        "sample_data": df.head(1).to_dict('records'),
+        "sample_data": df.head(1).astype(object).where(df.head(1).notna(), None).to_dict('records'),
         "companies": df['Company'].unique().tolist()[:5]
     })
 